@@ -1,9 +1,184 @@
 # ai-services/src/personality/analyzer.py
-from typing import Dict, List, Any
+from typing import Dict, List, Any, FrozenSet, Tuple
 import numpy as np
 from dataclasses import dataclass
-
-@dataclass
+from functools import lru_cache
+import asyncio
+
+BIG_FIVE_TRAITS = (
+    'openness',
+    'conscientiousness',
+    'extraversion',
+    'agreeableness',
+    'neuroticism'
+)
+
+# Reading features associated with each trait, and how strongly
+_TRAIT_FEATURE_WEIGHTS = {
+    'openness': {
+        'experimental_genres': 0.8,
+        'complex_narratives': 0.7,
+        'diverse_authors': 0.6,
+        'unconventional_formats': 0.5
+    },
+    'conscientiousness': {
+        'non_fiction': 0.7,
+        'educational_content': 0.8,
+        'structured_narratives': 0.6,
+        'goal_oriented_reading': 0.9
+    },
+    'extraversion': {
+        'social_themes': 0.7,
+        'dialogue_heavy': 0.6,
+        'group_reading': 0.8,
+        'popular_titles': 0.5
+    },
+    'agreeableness': {
+        'character_driven': 0.8,
+        'emotional_stories': 0.7,
+        'positive_endings': 0.6,
+        'relationship_focus': 0.9
+    },
+    'neuroticism': {
+        'emotional_intensity': 0.6,
+        'psychological_themes': 0.7,
+        'cathartic_stories': 0.8,
+        'self_help': 0.5
+    }
+}
+
+# Same weights as a (traits x features) matrix, rows in BIG_FIVE_TRAITS order
+_FEATURES = tuple(
+    feature for trait in BIG_FIVE_TRAITS for feature in _TRAIT_FEATURE_WEIGHTS[trait]
+)
+_FEATURE_COL = {feature: i for i, feature in enumerate(_FEATURES)}
+_TRAIT_WEIGHTS = np.array(
+    [
+        [_TRAIT_FEATURE_WEIGHTS[trait].get(feature, 0.0) for feature in _FEATURES]
+        for trait in BIG_FIVE_TRAITS
+    ],
+    dtype=np.float32
+)
+
+# Dominant-trait rules, applied in order:
+# (trait, threshold, preferred genres, recommendations, preference overrides)
+_TRAIT_RULES = (
+    (
+        'openness', 0.7,
+        (
+            'Experimental Fiction', 'Science Fiction', 'Philosophy',
+            'Magical Realism', 'Avant-garde'
+        ),
+        (
+            'Experimental literature and avant-garde fiction',
+            'Cross-cultural narratives and diverse perspectives',
+            'Genre-blending and unconventional storytelling',
+            'Philosophy and abstract concepts in fiction'
+        ),
+        {'experimental_content': True, 'content_complexity': 'high'}
+    ),
+    (
+        'conscientiousness', 0.7,
+        (
+            'Non-fiction', 'Biography', 'History', 'Self-help',
+            'Educational', 'Technical'
+        ),
+        (
+            'Non-fiction and educational content',
+            'Biographies of successful individuals',
+            'Self-improvement and productivity books',
+            'Historical and factual narratives'
+        ),
+        {'reading_pace': 'structured'}
+    ),
+    (
+        'extraversion', 0.7,
+        (
+            'Contemporary Fiction', 'Romance', 'Adventure',
+            'Social Commentary'
+        ),
+        (
+            'Books with strong social themes',
+            'Dialogue-driven narratives',
+            'Popular contemporary fiction',
+            'Books that spark discussion and debate'
+        ),
+        {'social_reading': True, 'narrative_style': 'dialogue-heavy'}
+    ),
+    (
+        'agreeableness', 0.7,
+        (
+            'Romance', 'Family Saga', 'Coming-of-age',
+            'Inspirational', 'Feel-good Fiction'
+        ),
+        (
+            'Character-driven stories with emotional depth',
+            'Books exploring relationships and human connection',
+            'Uplifting and inspirational narratives',
+            'Stories with positive, hopeful endings'
+        ),
+        {'narrative_style': 'character-driven'}
+    ),
+    (
+        'neuroticism', 0.6,
+        (
+            'Psychological Fiction', 'Drama', 'Memoir',
+            'Self-help', 'Mental Health'
+        ),
+        (
+            'Psychological fiction and introspective narratives',
+            'Books dealing with mental health and personal growth',
+            'Cathartic and emotionally intense stories',
+            'Memoirs and personal transformation stories'
+        ),
+        {}
+    )
+)
+
+def _dominant_traits(traits: Dict[str, float]) -> FrozenSet[str]:
+    """
+    Traits scoring above their rule threshold; all trait-based output depends only on this
+    """
+    return frozenset(
+        trait for trait, threshold, _, _, _ in _TRAIT_RULES if traits[trait] > threshold
+    )
+
+@lru_cache(maxsize=None)  # At most 2**6 distinct keys
+def _reading_preferences(dominant: FrozenSet[str], low_openness: bool) -> Dict[str, Any]:
+    preferences = {
+        'preferred_genres': (),
+        'content_complexity': 'medium',
+        'narrative_style': 'balanced',
+        'book_length': 'medium',
+        'reading_pace': 'moderate',
+        'social_reading': False,
+        'experimental_content': False
+    }
+
+    # Genre preferences based on traits
+    for trait, _, genres, _, overrides in _TRAIT_RULES:
+        if trait in dominant:
+            preferences['preferred_genres'] += genres
+            preferences.update(overrides)
+
+    # Book length preferences
+    if 'conscientiousness' in dominant:
+        preferences['book_length'] = 'long'  # Willing to commit to longer books
+    elif low_openness:
+        preferences['book_length'] = 'short'  # Prefers familiar, shorter reads
+
+    return preferences
+
+@lru_cache(maxsize=None)
+def _personality_recommendations(dominant: FrozenSet[str]) -> Tuple[str, ...]:
+    recommendations = ()
+    for trait, _, _, trait_recommendations, _ in _TRAIT_RULES:
+        if trait in dominant:
+            recommendations += trait_recommendations
+
+    return recommendations[:10]  # Return top 10 recommendations
+
+@dataclass(slots=True, frozen=True)
 class PersonalityProfile:
     openness: float
     conscientiousness: float
@@ -15,38 +190,16 @@ class PersonalityProfile:
 
 class PersonalityAnalyzer:
     def __init__(self):
-        self.trait_weights = {
-            'openness': {
-                'experimental_genres': 0.8,
-                'complex_narratives': 0.7,
-                'diverse_authors': 0.6,
-                'unconventional_formats': 0.5
-            },
-            'conscientiousness': {
-                'non_fiction': 0.7,
-                'educational_content': 0.8,
-                'structured_narratives': 0.6,
-                'goal_oriented_reading': 0.9
-            },
-            'extraversion': {
-                'social_themes': 0.7,
-                'dialogue_heavy': 0.6,
-                'group_reading': 0.8,
-                'popular_titles': 0.5
-            },
-            'agreeableness': {
-                'character_driven': 0.8,
-                'emotional_stories': 0.7,
-                'positive_endings': 0.6,
-                'relationship_focus': 0.9
-            },
-            'neuroticism': {
-                'emotional_intensity': 0.6,
-                'psychological_themes': 0.7,
-                'cathartic_stories': 0.8,
-                'self_help': 0.5
-            }
-        }
+        self._trait_id = {trait: i for i, trait in enumerate(BIG_FIVE_TRAITS)}
+        self.trait_weights = _TRAIT_WEIGHTS
+
+    def trait_affinity(self, features: List[str]) -> Dict[str, float]:
+        """
+        Weighted affinity of each trait for a set of reading features
+        """
+        active = np.zeros(len(_FEATURES), dtype=np.float32)
+        active[[_FEATURE_COL[f] for f in features if f in _FEATURE_COL]] = 1.0
+        return dict(zip(BIG_FIVE_TRAITS, (self.trait_weights @ active).tolist()))
 
     def analyze_personality(
         self,
@@ -84,30 +237,28 @@ class PersonalityAnalyzer:
         """
         Calculate Big Five personality traits from quiz responses
         """
-        traits = {
-            'openness': [],
-            'conscientiousness': [],
-            'extraversion': [],
-            'agreeableness': [],
-            'neuroticism': []
-        }
-
-        for question_id, response in quiz_responses.items():
-            trait = response.get('trait')
-            value = response.get('value', 0) / 5.0  # Normalize to 0-1
-
-            if trait in traits:
-                traits[trait].append(value)
+        responses = [
+            response for response in quiz_responses.values()
+            if response.get('trait') in self._trait_id
+        ]
+
+        trait_ids = np.fromiter(
+            (self._trait_id[response['trait']] for response in responses),
+            dtype=np.intp,
+            count=len(responses)
+        )
+        values = np.fromiter(
+            (response.get('value', 0) for response in responses),
+            dtype=np.float64,
+            count=len(responses)
+        ) / 5.0  # Normalize to 0-1
 
-        # Calculate average scores
-        final_traits = {}
-        for trait, values in traits.items():
-            if values:
-                final_traits[trait] = np.mean(values)
-            else:
-                final_traits[trait] = 0.5  # Default neutral score
+        # Average scores per trait in one pass; default neutral score when unanswered
+        sums = np.bincount(trait_ids, weights=values, minlength=len(BIG_FIVE_TRAITS))
+        counts = np.bincount(trait_ids, minlength=len(BIG_FIVE_TRAITS))
+        means = np.divide(sums, counts, out=np.full(len(BIG_FIVE_TRAITS), 0.5), where=counts > 0)
 
-        return final_traits
+        return dict(zip(BIG_FIVE_TRAITS, means.tolist()))
 
     def analyze_reading_history(self, reading_history: List[Dict]) -> Dict[str, float]:
         """
@@ -142,129 +293,51 @@ class PersonalityAnalyzer:
         """
         Generate detailed reading preferences based on personality traits
         """
-        preferences = {
-            'preferred_genres': [],
-            'content_complexity': 'medium',
-            'narrative_style': 'balanced',
-            'book_length': 'medium',
-            'reading_pace': 'moderate',
-            'social_reading': False,
-            'experimental_content': False
-        }
+        preferences = _reading_preferences(
+            _dominant_traits(traits),
+            traits['openness'] < 0.3
+        )
 
-        # Genre preferences based on traits
-        if traits['openness'] > 0.7:
-            preferences['preferred_genres'].extend([
-                'Experimental Fiction', 'Science Fiction', 'Philosophy',
-                'Magical Realism', 'Avant-garde'
-            ])
-            preferences['experimental_content'] = True
-            preferences['content_complexity'] = 'high'
-
-        if traits['conscientiousness'] > 0.7:
-            preferences['preferred_genres'].extend([
-                'Non-fiction', 'Biography', 'History', 'Self-help',
-                'Educational', 'Technical'
-            ])
-            preferences['reading_pace'] = 'structured'
-
-        if traits['extraversion'] > 0.7:
-            preferences['preferred_genres'].extend([
-                'Contemporary Fiction', 'Romance', 'Adventure',
-                'Social Commentary'
-            ])
-            preferences['social_reading'] = True
-            preferences['narrative_style'] = 'dialogue-heavy'
-
-        if traits['agreeableness'] > 0.7:
-            preferences['preferred_genres'].extend([
-                'Romance', 'Family Saga', 'Coming-of-age',
-                'Inspirational', 'Feel-good Fiction'
-            ])
-            preferences['narrative_style'] = 'character-driven'
-
-        if traits['neuroticism'] > 0.6:
-            preferences['preferred_genres'].extend([
-                'Psychological Fiction', 'Drama', 'Memoir',
-                'Self-help', 'Mental Health'
-            ])
-
-        # Book length preferences
-        if traits['conscientiousness'] > 0.7:
-            preferences['book_length'] = 'long'  # Willing to commit to longer books
-        elif traits['openness'] < 0.3:
-            preferences['book_length'] = 'short'  # Prefers familiar, shorter reads
-
-        return preferences
+        # Hand out a copy so callers never mutate the cached entry
+        return {**preferences, 'preferred_genres': list(preferences['preferred_genres'])}
 
     def generate_personality_recommendations(self, traits: Dict[str, float]) -> List[str]:
         """
         Generate specific book recommendations based on personality profile
         """
-        recommendations = []
-
-        # High Openness recommendations
-        if traits['openness'] > 0.7:
-            recommendations.extend([
-                'Experimental literature and avant-garde fiction',
-                'Cross-cultural narratives and diverse perspectives',
-                'Genre-blending and unconventional storytelling',
-                'Philosophy and abstract concepts in fiction'
-            ])
-
-        # High Conscientiousness recommendations
-        if traits['conscientiousness'] > 0.7:
-            recommendations.extend([
-                'Non-fiction and educational content',
-                'Biographies of successful individuals',
-                'Self-improvement and productivity books',
-                'Historical and factual narratives'
-            ])
-
-        # High Extraversion recommendations
-        if traits['extraversion'] > 0.7:
-            recommendations.extend([
-                'Books with strong social themes',
-                'Dialogue-driven narratives',
-                'Popular contemporary fiction',
-                'Books that spark discussion and debate'
-            ])
-
-        # High Agreeableness recommendations
-        if traits['agreeableness'] > 0.7:
-            recommendations.extend([
-                'Character-driven stories with emotional depth',
-                'Books exploring relationships and human connection',
-                'Uplifting and inspirational narratives',
-                'Stories with positive, hopeful endings'
-            ])
-
-        # High Neuroticism recommendations
-        if traits['neuroticism'] > 0.6:
-            recommendations.extend([
-                'Psychological fiction and introspective narratives',
-                'Books dealing with mental health and personal growth',
-                'Cathartic and emotionally intense stories',
-                'Memoirs and personal transformation stories'
-            ])
-
-        return recommendations[:10]  # Return top 10 recommendations
+        return list(_personality_recommendations(_dominant_traits(traits)))
 
 # FastAPI endpoint
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 personality_analyzer = PersonalityAnalyzer()
 
 class PersonalityAnalysisRequest(BaseModel):
     quiz_responses: Dict[int, Any]
     reading_history: List[Dict] = None
 
-@app.post("/analyze-personality")
+class PersonalityTraits(BaseModel):
+    openness: float
+    conscientiousness: float
+    extraversion: float
+    agreeableness: float
+    neuroticism: float
+
+class PersonalityAnalysisResponse(BaseModel):
+    personality_profile: PersonalityTraits
+    reading_preferences: Dict[str, Any]
+    recommendations: List[str]
+    analysis_summary: str
+
+@app.post("/analyze-personality", response_model=PersonalityAnalysisResponse)
 async def analyze_personality(request: PersonalityAnalysisRequest):
     try:
-        profile = personality_analyzer.analyze_personality(
+        # CPU-bound; run in a worker thread so the event loop keeps serving requests
+        profile = await asyncio.to_thread(
+            personality_analyzer.analyze_personality,
             request.quiz_responses,
             request.reading_history
         )
@@ -288,17 +361,22 @@ def generate_personality_summary(profile: PersonalityProfile) -> str:
     """
     Generate a human-readable summary of the personality analysis
     """
+    traits = {trait: getattr(profile, trait) for trait in BIG_FIVE_TRAITS}
+    return _personality_summary(_dominant_traits(traits))
+
+@lru_cache(maxsize=None)
+def _personality_summary(dominant: FrozenSet[str]) -> str:
     dominant_traits = []
 
-    if profile.openness > 0.7:
+    if 'openness' in dominant:
         dominant_traits.append("highly open to new experiences")
-    if profile.conscientiousness > 0.7:
+    if 'conscientiousness' in dominant:
         dominant_traits.append("very organized and goal-oriented")
-    if profile.extraversion > 0.7:
+    if 'extraversion' in dominant:
         dominant_traits.append("socially engaged")
-    if profile.agreeableness > 0.7:
+    if 'agreeableness' in dominant:
         dominant_traits.append("empathetic and cooperative")
-    if profile.neuroticism > 0.6:
+    if 'neuroticism' in dominant:
         dominant_traits.append("emotionally sensitive")
 
     if not dominant_traits:
@@ -307,11 +385,11 @@ def generate_personality_summary(profile: PersonalityProfile) -> str:
     summary = f"Your reading personality shows that you are {', '.join(dominant_traits)}. "
 
     # Add reading-specific insights
-    if profile.openness > 0.7:
+    if 'openness' in dominant:
         summary += "You're likely to enjoy experimental and diverse literature. "
-    if profile.conscientiousness > 0.7:
+    if 'conscientiousness' in dominant:
         summary += "You prefer structured, informative content and are likely to finish books you start. "
-    if profile.extraversion > 0.7:
+    if 'extraversion' in dominant:
         summary += "You enjoy books that you can discuss with others and prefer socially relevant themes. "
 
     return summary
@@ -1,38 +1,161 @@
 # ai-services/src/recommendation/collaborative_filter.py
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
-from typing import List, Dict, Tuple
+from sklearn.preprocessing import LabelEncoder
+from scipy.sparse import csr_matrix
+import faiss
+import scipy
+import sklearn
+from typing import List, Dict, Tuple, Optional, Any
 import asyncio
+import hashlib
+import joblib
+import os
+import tempfile
+
+# Fitted models are cached here, keyed on a fingerprint of their training data
+MODEL_CACHE_DIR = os.getenv('MODEL_CACHE_DIR', 'model_cache')
+
+# Pickled models are only safe to load with the library versions that wrote them
+_LIB_VERSIONS = (
+    ('numpy', np.__version__),
+    ('pandas', pd.__version__),
+    ('scipy', scipy.__version__),
+    ('sklearn', sklearn.__version__),
+    ('joblib', joblib.__version__),
+    ('faiss', getattr(faiss, '__version__', None)),
+)
+
+def _fingerprint(data: pd.DataFrame, *params: Any) -> str:
+    """
+    Stable hash of training data and model parameters
+    """
+    digest = hashlib.blake2b(
+        pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes(),
+        digest_size=16
+    )
+    digest.update(repr((params, _LIB_VERSIONS)).encode())
+    return digest.hexdigest()
+
+def _load_cached(name: str) -> Optional[Any]:
+    path = os.path.join(MODEL_CACHE_DIR, f"{name}.joblib")
+    try:
+        return joblib.load(path)
+    except Exception:
+        # Missing, unreadable or incompatible cache is just a miss
+        return None
+
+def _store_cached(name: str, value: Any):
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        # Dump to a temp file and rename it into place, so other workers never load a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=MODEL_CACHE_DIR, suffix='.tmp')
+        os.close(fd)
+        try:
+            joblib.dump(value, tmp_path)
+            os.replace(tmp_path, os.path.join(MODEL_CACHE_DIR, f"{name}.joblib"))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # Drop models of the same kind trained on older data
+        prefix = name.rsplit('_', 1)[0] + '_'
+        for entry in os.listdir(MODEL_CACHE_DIR):
+            if entry.startswith(prefix) and entry.endswith('.joblib') and entry != f"{name}.joblib":
+                try:
+                    os.unlink(os.path.join(MODEL_CACHE_DIR, entry))
+                except OSError:
+                    pass
+    except OSError:
+        # The cache is an optimization; a read-only filesystem shouldn't fail training
+        pass
+
+def _top_n_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of the n highest scores, best first, ties broken by position
+    """
+    n = min(n, scores.size)
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Partition around the n-th best score, then sort only the selection
+    cutoff = -np.partition(-scores, n - 1)[n - 1]
+    above = np.flatnonzero(scores > cutoff)
+    at_cutoff = np.flatnonzero(scores == cutoff)[:n - above.size]
+    top = np.sort(np.concatenate((above, at_cutoff)))
+    return top[np.argsort(-scores[top], kind='stable')]
 
 class CollaborativeFilter:
     def __init__(self, n_components: int = 50):
         self.n_components = n_components
-        self.svd = TruncatedSVD(n_components=n_components, random_state=42)
+        # Randomized SVD preserves the float32 dtype of the rating matrix
+        self.svd = TruncatedSVD(
+            n_components=n_components,
+            algorithm='randomized',
+            random_state=42
+        )
         self.user_item_matrix = None
-        self.user_similarity = None
-        self.item_similarity = None
+        self.user_ids = None
+        self.book_ids = None
+        self._user_factors = None
+        self._neighbor_index = None
 
     async def train(self, ratings_data: pd.DataFrame):
         """
         Train the collaborative filtering model
         ratings_data: DataFrame with columns [user_id, book_id, rating]
         """
-        # Create user-item matrix
-        self.user_item_matrix = ratings_data.pivot(
-            index='user_id',
-            columns='book_id',
-            values='rating'
-        ).fillna(0)
-
-        # Apply SVD for dimensionality reduction
-        user_factors = self.svd.fit_transform(self.user_item_matrix)
-        item_factors = self.svd.components_.T
-
-        # Calculate similarities
-        self.user_similarity = cosine_similarity(user_factors)
-        self.item_similarity = cosine_similarity(item_factors)
+        cache_key = 'cf_v2_' + _fingerprint(
+            ratings_data[['user_id', 'book_id', 'rating']], self.n_components
+        )
+        cached = _load_cached(cache_key)
+
+        if cached is not None:
+            (
+                self.user_ids, self.book_ids, self.user_item_matrix,
+                self.svd, user_factors
+            ) = cached
+        else:
+            # csr_matrix sums repeated (row, col) entries, so keep only each user's latest rating of a book
+            ratings_data = ratings_data.drop_duplicates(['user_id', 'book_id'], keep='last')
+
+            # Encode ids to contiguous row/column positions
+            user_encoder = LabelEncoder().fit(ratings_data['user_id'])
+            book_encoder = LabelEncoder().fit(ratings_data['book_id'])
+            self.user_ids = user_encoder.classes_
+            self.book_ids = book_encoder.classes_
+
+            # Create sparse user-item matrix straight from the rating triples
+            self.user_item_matrix = csr_matrix(
+                (
+                    ratings_data['rating'].to_numpy(dtype=np.float32),
+                    (
+                        user_encoder.transform(ratings_data['user_id']),
+                        book_encoder.transform(ratings_data['book_id'])
+                    )
+                ),
+                shape=(len(self.user_ids), len(self.book_ids))
+            )
+
+            # Apply SVD for dimensionality reduction
+            user_factors = np.ascontiguousarray(
+                self.svd.fit_transform(self.user_item_matrix), dtype=np.float32
+            )
+            faiss.normalize_L2(user_factors)
+
+            _store_cached(cache_key, (
+                self.user_ids, self.book_ids, self.user_item_matrix,
+                self.svd, user_factors
+            ))
+
+        self._user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self._book_index = {book_id: i for i, book_id in enumerate(self.book_ids)}
+
+        # Index normalized user factors; inner product is then cosine similarity
+        self._user_factors = user_factors
+        self._neighbor_index = faiss.IndexFlatIP(user_factors.shape[1])
+        self._neighbor_index.add(user_factors)
 
     async def get_user_recommendations(
         self,
@@ -42,37 +165,80 @@ class CollaborativeFilter:
         """
         Get book recommendations for a specific user
         """
+        # CPU-bound; FAISS and BLAS release the GIL, so a thread lets other sources run alongside
+        return await asyncio.to_thread(self._get_user_recommendations, user_id, n_recommendations)
+
+    def _get_user_recommendations(self, user_id: str, n_recommendations: int) -> List[Dict]:
         if self.user_item_matrix is None:
             raise ValueError("Model not trained yet")
 
-        user_idx = self.user_item_matrix.index.get_loc(user_id)
-        user_ratings = self.user_item_matrix.iloc[user_idx]
+        user_idx = self._user_index[user_id]
 
         # Find similar users
         similar_users = self.get_similar_users(user_idx, top_k=50)
 
-        # Get recommendations based on similar users' preferences
-        recommendations = []
-        for book_id in self.user_item_matrix.columns:
-            if user_ratings[book_id] == 0:  # User hasn't rated this book
-                predicted_rating = self.predict_rating(user_idx, book_id, similar_users)
-                recommendations.append({
-                    'book_id': book_id,
-                    'predicted_rating': predicted_rating,
-                    'recommendation_type': 'collaborative'
-                })
-
-        # Sort by predicted rating and return top N
-        recommendations.sort(key=lambda x: x['predicted_rating'], reverse=True)
-        return recommendations[:n_recommendations]
+        # Predict every book at once from similar users' preferences
+        predicted_ratings = self.predict_ratings(similar_users)
+
+        # Only consider books the user hasn't rated
+        user_ratings = self.user_item_matrix.getrow(user_idx)
+        unrated = np.ones(len(self.book_ids), dtype=bool)
+        unrated[user_ratings.indices[user_ratings.data != 0]] = False
+        candidates = np.flatnonzero(unrated)
+
+        # Select top N without sorting every candidate
+        scores = predicted_ratings[candidates]
+        top = _top_n_indices(scores, n_recommendations)
+
+        return [
+            {
+                'book_id': self.book_ids[candidates[i]],
+                'predicted_rating': float(scores[i]),
+                'recommendation_type': 'collaborative'
+            }
+            for i in top
+        ]
 
     def get_similar_users(self, user_idx: int, top_k: int = 50) -> List[Tuple[int, float]]:
         """
         Find users similar to the given user
         """
-        similarities = self.user_similarity[user_idx]
-        similar_indices = np.argsort(similarities)[::-1][1:top_k+1]  # Exclude self
-        return [(idx, similarities[idx]) for idx in similar_indices]
+        # Ask for one extra neighbour since the user matches itself
+        k = min(top_k + 1, self._neighbor_index.ntotal)
+        similarities, indices = self._neighbor_index.search(
+            self._user_factors[user_idx:user_idx + 1], k
+        )
+
+        similar_users = [
+            (int(idx), float(similarity))
+            for idx, similarity in zip(indices[0], similarities[0])
+            if idx != user_idx and idx >= 0  # Exclude self and empty slots
+        ]
+        return similar_users[:top_k]
+
+    def predict_ratings(self, similar_users: List[Tuple[int, float]]) -> np.ndarray:
+        """
+        Predict ratings for all books based on similar users
+        """
+        n_books = len(self.book_ids)
+        if not similar_users:
+            return np.zeros(n_books, dtype=np.float32)
+
+        user_indices = np.fromiter((idx for idx, _ in similar_users), dtype=np.intp)
+        similarities = np.fromiter((sim for _, sim in similar_users), dtype=np.float32)
+
+        ratings = self.user_item_matrix[user_indices]
+        rated = (ratings > 0).astype(np.float32)  # Users who have rated each book
+
+        weighted_sum = ratings.multiply(rated).T @ similarities
+        similarity_sum = rated.T @ np.abs(similarities)
+
+        return np.divide(
+            weighted_sum,
+            similarity_sum,
+            out=np.zeros(n_books, dtype=np.float32),
+            where=similarity_sum != 0
+        )
 
     def predict_rating(
         self,
@@ -83,26 +249,22 @@ class CollaborativeFilter:
         """
         Predict rating for a book based on similar users
         """
-        weighted_sum = 0
-        similarity_sum = 0
-
-        for similar_user_idx, similarity in similar_users:
-            rating = self.user_item_matrix.iloc[similar_user_idx][book_id]
-            if rating > 0:  # User has rated this book
-                weighted_sum += similarity * rating
-                similarity_sum += abs(similarity)
-
-        if similarity_sum == 0:
-            return 0
-
-        return weighted_sum / similarity_sum
+        return float(self.predict_ratings(similar_users)[self._book_index[book_id]])
 
 # Content-based filtering
 class ContentBasedFilter:
+    # Part of the TF-IDF cache key, so changing them invalidates cached models
+    TFIDF_PARAMS = {
+        'max_features': 5000,
+        'stop_words': 'english',
+        'ngram_range': (1, 2),
+        'dtype': np.float32
+    }
+
     def __init__(self):
         self.book_features = None
         self.tfidf_vectorizer = None
-        self.content_similarity = None
+        self._tfidf = None
 
     async def train(self, books_data: pd.DataFrame):
         """
@@ -110,7 +272,7 @@ class ContentBasedFilter:
         books_data: DataFrame with columns [book_id, title, author, genre, description]
         """
         from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.preprocessing import MultiLabelBinarizer
+        from sklearn.preprocessing import MultiLabelBinarizer, normalize
 
         # Combine text features
         books_data['combined_features'] = (
@@ -120,18 +282,27 @@ class ContentBasedFilter:
             books_data['description'].fillna('')
         )
 
-        # Create TF-IDF vectors
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
+        cache_key = 'tfidf_v2_' + _fingerprint(
+            books_data[['book_id', 'combined_features']], sorted(self.TFIDF_PARAMS.items())
         )
+        cached = _load_cached(cache_key)
+
+        if cached is not None:
+            self.tfidf_vectorizer, self._tfidf = cached
+        else:
+            # Create TF-IDF vectors
+            self.tfidf_vectorizer = TfidfVectorizer(**self.TFIDF_PARAMS)
 
-        tfidf_matrix = self.tfidf_vectorizer.fit_transform(books_data['combined_features'])
+            tfidf_matrix = self.tfidf_vectorizer.fit_transform(books_data['combined_features'])
 
-        # Calculate content similarity
-        self.content_similarity = cosine_similarity(tfidf_matrix)
+            # Keep L2-normalized sparse vectors; cosine similarity is then a dot product
+            self._tfidf = normalize(tfidf_matrix)
+
+            _store_cached(cache_key, (self.tfidf_vectorizer, self._tfidf))
         self.book_features = books_data.set_index('book_id')
+        self._book_pos = {book_id: i for i, book_id in enumerate(self.book_features.index)}
+        self._genres = self.book_features['genre'].to_numpy()
+        self._authors = self.book_features['author'].to_numpy()
 
     async def get_content_recommendations(
         self,
@@ -141,27 +312,60 @@ class ContentBasedFilter:
         """
         Get recommendations based on user's content preferences
         """
+        # CPU-bound; run in a thread so the event loop and the other sources keep going
+        return await asyncio.to_thread(self._get_content_recommendations, user_profile, n_recommendations)
+
+    def _get_content_recommendations(self, user_profile: Dict, n_recommendations: int) -> List[Dict]:
         # Analyze user's reading history to build preference profile
         preferred_genres = user_profile.get('preferred_genres', [])
         favorite_authors = user_profile.get('favorite_authors', [])
         reading_history = user_profile.get('reading_history', [])
 
-        # Score books based on content similarity to user preferences
-        recommendations = []
+        # Score every book at once
+        scores = np.zeros(len(self._book_pos))
+        scores += 0.4 * np.isin(self._genres, list(preferred_genres))
+        scores += 0.3 * np.isin(self._authors, list(favorite_authors))
+        scores += 0.3 * self.history_similarity(reading_history).astype(np.float64)
 
-        for book_id, book_data in self.book_features.iterrows():
-            if book_id not in reading_history:
-                score = self.calculate_content_score(book_data, user_profile)
-                recommendations.append({
-                    'book_id': book_id,
-                    'content_score': score,
-                    'recommendation_type': 'content_based'
-                })
+        # Skip books the user has already read
+        unread = np.ones(len(self._book_pos), dtype=bool)
+        unread[[self._book_pos[b] for b in reading_history if b in self._book_pos]] = False
+        candidates = np.flatnonzero(unread)
 
-        recommendations.sort(key=lambda x: x['content_score'], reverse=True)
-        return recommendations[:n_recommendations]
+        top = _top_n_indices(scores[candidates], n_recommendations)
+        book_ids = self.book_features.index[candidates[top]]
+
+        return [
+            {
+                'book_id': book_id,
+                'content_score': float(score),
+                'recommendation_type': 'content_based'
+            }
+            for book_id, score in zip(book_ids, scores[candidates[top]])
+        ]
 
-    def calculate_content_score(self, book_data: pd.Series, user_profile: Dict) -> float:
+    def history_similarity(self, reading_history: List[str]) -> np.ndarray:
+        """
+        Max content similarity of every book to any book in the reading history
+        """
+        history_idx = [
+            self._book_pos[read_book_id]
+            for read_book_id in reading_history
+            if read_book_id in self._book_pos
+        ]
+        if not history_idx:
+            return np.zeros(self._tfidf.shape[0], dtype=np.float32)
+
+        # Sparse (books x history) product instead of a dense (books x books) matrix
+        similarities = self._tfidf @ self._tfidf[history_idx].T
+        return similarities.max(axis=1).toarray().ravel()
+
+    def calculate_content_score(
+        self,
+        book_data: pd.Series,
+        user_profile: Dict,
+        history_similarity: Optional[np.ndarray] = None
+    ) -> float:
         """
         Calculate content-based score for a book
         """
@@ -178,16 +382,11 @@ class ContentBasedFilter:
         # Similarity to previously liked books
         reading_history = user_profile.get('reading_history', [])
         if reading_history:
-            book_idx = self.book_features.index.get_loc(book_data.name)
-            max_similarity = 0
-
-            for read_book_id in reading_history:
-                if read_book_id in self.book_features.index:
-                    read_book_idx = self.book_features.index.get_loc(read_book_id)
-                    similarity = self.content_similarity[book_idx][read_book_idx]
-                    max_similarity = max(max_similarity, similarity)
+            if history_similarity is None:
+                history_similarity = self.history_similarity(reading_history)
 
-            score += 0.3 * max_similarity
+            book_idx = self._book_pos[book_data.name]
+            score += 0.3 * history_similarity[book_idx]
 
         return score
 
@@ -207,61 +406,66 @@ class HybridRecommendationEngine:
         """
         Combine multiple recommendation approaches
         """
-        # Get recommendations from different algorithms
-        collab_recs = await self.collaborative_filter.get_user_recommendations(
-            user_id, n_recommendations * 2
-        )
-
-        content_recs = await self.content_filter.get_content_recommendations(
-            user_profile, n_recommendations * 2
-        )
-
-        social_recs = await self.social_analyzer.get_social_recommendations(
-            user_profile, n_recommendations * 2
+        # Get recommendations from different algorithms concurrently
+        collab_recs, content_recs, social_recs = await asyncio.gather(
+            self.collaborative_filter.get_user_recommendations(
+                user_id, n_recommendations * 2
+            ),
+            self.content_filter.get_content_recommendations(
+                user_profile, n_recommendations * 2
+            ),
+            self.social_analyzer.get_social_recommendations(
+                user_profile, n_recommendations * 2
+            )
         )
 
         # Combine and weight recommendations
-        combined_recs = self.combine_recommendations(
-            collab_recs, content_recs, social_recs
+        return self.combine_recommendations(
+            collab_recs, content_recs, social_recs, n_recommendations
         )
 
-        return combined_recs[:n_recommendations]
-
     def combine_recommendations(
         self,
         collab_recs: List[Dict],
         content_recs: List[Dict],
-        social_recs: List[Dict]
+        social_recs: List[Dict],
+        n_recommendations: Optional[int] = None
     ) -> List[Dict]:
         """
         Combine recommendations using weighted scoring
         """
-        book_scores = {}
+        # Collaborative filtering (40%), content-based (35%), social (25%)
+        sources = (
+            (collab_recs, 'predicted_rating', 0.4),
+            (content_recs, 'content_score', 0.35),
+            (social_recs, 'social_score', 0.25)
+        )
+
+        book_ids = [rec['book_id'] for recs, _, _ in sources for rec in recs]
+        if not book_ids:
+            return []
 
-        # Weight collaborative filtering (40%)
-        for rec in collab_recs:
-            book_id = rec['book_id']
-            book_scores[book_id] = book_scores.get(book_id, 0) + 0.4 * rec['predicted_rating']
+        scores = np.fromiter(
+            (weight * rec[key] for recs, key, weight in sources for rec in recs),
+            dtype=np.float64,
+            count=len(book_ids)
+        )
 
-        # Weight content-based (35%)
-        for rec in content_recs:
-            book_id = rec['book_id']
-            book_scores[book_id] = book_scores.get(book_id, 0) + 0.35 * rec['content_score']
+        # Sum scores per book, keeping books in first-seen order
+        codes, unique_ids = pd.factorize(np.asarray(book_ids, dtype=object))
+        book_scores = np.bincount(codes, weights=scores)
 
-        # Weight social recommendations (25%)
-        for rec in social_recs:
-            book_id = rec['book_id']
-            book_scores[book_id] = book_scores.get(book_id, 0) + 0.25 * rec['social_score']
+        # Select the top N, ties broken by first-seen order
+        top = _top_n_indices(
+            book_scores,
+            len(book_scores) if n_recommendations is None else n_recommendations
+        )
 
-        # Convert to list and sort
-        final_recommendations = [
+        return [
             {
-                'book_id': book_id,
-                'combined_score': score,
+                'book_id': unique_ids[i],
+                'combined_score': float(book_scores[i]),
                 'recommendation_type': 'hybrid'
             }
-            for book_id, score in book_scores.items()
+            for i in top
         ]
-
-        final_recommendations.sort(key=lambda x: x['combined_score'], reverse=True)
-        return final_recommendations
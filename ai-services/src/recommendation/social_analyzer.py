@@ -1,17 +1,167 @@
 # ai-services/src/recommendation/social_analyzer.py
-import requests
+import aiohttp
 import asyncio
-from typing import Dict, List, Any
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Any, Optional, Set
 import cv2
 import numpy as np
+from numba import njit
 from PIL import Image
 import io
-import colorsys
+import ssl
+
+# Order of the mood scores produced by mood_vector and analyze_board
+MOODS = ('romantic', 'dark', 'bright', 'minimalist')
+
+# Pinterest keyword (matched as a substring) to book genres
+KEYWORD_GENRE_MAP = {
+    'vintage': ['Historical Fiction'],
+    'nature': ['Adventure', 'Environmental'],
+    'travel': ['Adventure', 'Travel'],
+    'art': ['Art', 'Biography'],
+    'fashion': ['Contemporary Fiction'],
+    'food': ['Cooking', 'Memoir'],
+    'quotes': ['Poetry', 'Philosophy']
+}
+
+# Spotify genre (matched as a substring) to book genres
+MUSIC_GENRE_MAP = {
+    'classical': ['Classical Literature', 'Philosophy', 'History'],
+    'jazz': ['Beat Literature', 'Biography', 'Music'],
+    'rock': ['Counterculture', 'Biography', 'Music'],
+    'electronic': ['Science Fiction', 'Cyberpunk', 'Futurism'],
+    'folk': ['Historical Fiction', 'Nature Writing', 'Americana'],
+    'hip-hop': ['Urban Fiction', 'Social Commentary', 'Biography'],
+    'country': ['Southern Fiction', 'Americana', 'Rural Life'],
+    'indie': ['Independent Literature', 'Alternative Fiction']
+}
+
+@njit(cache=True)
+def _classify_moods(rgb):
+    """
+    Mood of each color in a (K, 3) RGB array in [0, 1], as an index into MOODS
+    (len(MOODS) when no mood applies)
+    """
+    classes = np.full(rgb.shape[0], 4, dtype=np.uint8)
+
+    for i in range(rgb.shape[0]):
+        red, green, blue = rgb[i, 0], rgb[i, 1], rgb[i, 2]
+
+        # Convert to HSV for better analysis (same formulas as colorsys.rgb_to_hsv)
+        max_c = max(red, green, blue)
+        min_c = min(red, green, blue)
+        value = max_c
+        if min_c == max_c:
+            hue = 0.0
+            saturation = 0.0
+        else:
+            delta = max_c - min_c
+            saturation = delta / max_c
+            red_c = (max_c - red) / delta
+            green_c = (max_c - green) / delta
+            blue_c = (max_c - blue) / delta
+            if red == max_c:
+                hue = blue_c - green_c
+            elif green == max_c:
+                hue = 2.0 + red_c - blue_c
+            else:
+                hue = 4.0 + green_c - red_c
+            hue = (hue / 6.0) % 1.0
+
+        # Analyze mood based on HSV values
+        if saturation < 0.3 and value > 0.8:  # Light, desaturated
+            classes[i] = 3
+        elif value < 0.3:  # Dark colors
+            classes[i] = 1
+        elif saturation > 0.7 and value > 0.7:  # Bright, saturated
+            classes[i] = 2
+        elif 0.8 < hue < 1.0 or 0.0 < hue < 0.1:  # Pink/red hues
+            classes[i] = 0
+
+    return classes
+
+# Mood of every 4-bit color bin center, i.e. every color extract_palettes can return,
+# so palettes are classified with a table lookup. Also compiles the kernel at import
+_BIN_CENTERS = (np.arange(4096)[:, None] >> np.array([8, 4, 0]) & 15) << 4 | 8
+_MOOD_LUT = _classify_moods(_BIN_CENTERS / 255.0)
+
+def _mood_counts(classes: np.ndarray) -> np.ndarray:
+    return np.bincount(classes, minlength=len(MOODS) + 1)[:len(MOODS)]
+
+# One SSL context for every session, so CA certificates are loaded once
+_SSL_CONTEXT = ssl.create_default_context()
+
+def _create_session(limit_per_host: int) -> aiohttp.ClientSession:
+    """
+    Keep-alive session whose pooled connections are reused across requests
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit_per_host=limit_per_host,
+            keepalive_timeout=30,
+            ssl=_SSL_CONTEXT
+        )
+    )
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `burst`
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
 
 class PinterestAnalyzer:
+    # Repinned images share URLs, so keep recent palettes around (a few MB at most)
+    PALETTE_CACHE_SIZE = 4096
+
     def __init__(self, client_id: str, client_secret: str):
         self.client_id = client_id
         self.client_secret = client_secret
+        self.rate_limiter = RateLimiter(rate=10, burst=20)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._image_session: Optional[aiohttp.ClientSession] = None
+        self._palette_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        # Caps concurrent image downloads across all boards being analyzed
+        self._download_semaphore = asyncio.Semaphore(16)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Shared API session, created on first use inside the running event loop
+        """
+        if self._session is None or self._session.closed:
+            self._session = _create_session(limit_per_host=8)
+        return self._session
+
+    def _get_image_session(self) -> aiohttp.ClientSession:
+        """
+        Separate session for pin images, which are spread over many CDN hosts
+        """
+        if self._image_session is None or self._image_session.closed:
+            self._image_session = _create_session(limit_per_host=32)
+        return self._image_session
+
+    async def close(self):
+        for session in (self._session, self._image_session):
+            if session is not None:
+                await session.close()
 
     async def analyze_pinterest_boards(self, access_token: str) -> Dict[str, Any]:
         """
@@ -21,35 +171,33 @@ class PinterestAnalyzer:
         analysis_results = {
             'color_preferences': [],
             'aesthetic_themes': [],
-            'interest_keywords': [],
+            'interest_keywords': Counter(),
             'mood_profile': {},
             'genre_indicators': []
         }
 
-        for board in boards:
-            board_analysis = await self.analyze_board(board, access_token)
+        board_analyses = await asyncio.gather(
+            *(self.analyze_board(board, access_token) for board in boards)
+        )
 
+        mood_totals = np.zeros(len(MOODS))
+        for board_analysis in board_analyses:
             # Aggregate color preferences
             analysis_results['color_preferences'].extend(board_analysis['colors'])
 
             # Extract themes
             analysis_results['aesthetic_themes'].extend(board_analysis['themes'])
 
-            # Collect keywords
-            analysis_results['interest_keywords'].extend(board_analysis['keywords'])
+            # Count keywords
+            analysis_results['interest_keywords'].update(board_analysis['keywords'])
 
             # Analyze mood
-            mood = board_analysis['mood']
-            for mood_type, score in mood.items():
-                analysis_results['mood_profile'][mood_type] = (
-                    analysis_results['mood_profile'].get(mood_type, 0) + score
-                )
+            mood_totals += board_analysis['mood']
 
         # Normalize mood scores
         total_boards = len(boards)
         if total_boards > 0:
-            for mood_type in analysis_results['mood_profile']:
-                analysis_results['mood_profile'][mood_type] /= total_boards
+            analysis_results['mood_profile'] = dict(zip(MOODS, (mood_totals / total_boards).tolist()))
 
         # Map to book genres
         analysis_results['genre_indicators'] = self.map_to_book_genres(analysis_results)
@@ -61,14 +209,14 @@ class PinterestAnalyzer:
         Fetch user's Pinterest boards
         """
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(
+        await self.rate_limiter.acquire()
+        async with self._get_session().get(
             '<https://api.pinterest.com/v5/boards>',
             headers=headers
-        )
-
-        if response.status_code == 200:
-            return response.json().get('items', [])
-        return []
+        ) as response:
+            if response.status == 200:
+                return (await response.json()).get('items', [])
+            return []
 
     async def analyze_board(self, board: Dict, access_token: str) -> Dict[str, Any]:
         """
@@ -79,21 +227,25 @@ class PinterestAnalyzer:
         colors = []
         themes = []
         keywords = []
-        mood_scores = {'romantic': 0, 'dark': 0, 'bright': 0, 'minimalist': 0}
+        mood_scores = np.zeros(len(MOODS))  # In MOODS order
 
-        for pin in pins[:20]:  # Analyze first 20 pins
-            if pin.get('media', {}).get('images'):
-                image_url = pin['media']['images']['original']['url']
+        sampled_pins = pins[:20]  # Analyze first 20 pins
 
-                # Analyze image colors
-                pin_colors = await self.extract_colors_from_image(image_url)
-                colors.extend(pin_colors)
+        # Download and analyze pin image colors as one batch
+        image_urls = [
+            pin['media']['images']['original']['url']
+            for pin in sampled_pins
+            if pin.get('media', {}).get('images')
+        ]
+        pin_palettes = await self.extract_palettes(image_urls)
 
-                # Analyze mood from colors and composition
-                pin_mood = self.analyze_image_mood(pin_colors)
-                for mood_type, score in pin_mood.items():
-                    mood_scores[mood_type] += score
+        for palette in pin_palettes:
+            colors.extend(self.palette_to_hex(palette))
 
+            # Analyze mood from colors and composition
+            mood_scores += self.palette_mood_vector(palette)
+
+        for pin in sampled_pins:
             # Extract keywords from description
             description = pin.get('description', '') + ' ' + pin.get('title', '')
             pin_keywords = self.extract_keywords(description)
@@ -102,8 +254,7 @@ class PinterestAnalyzer:
         # Normalize mood scores
         total_pins = len(pins)
         if total_pins > 0:
-            for mood_type in mood_scores:
-                mood_scores[mood_type] /= total_pins
+            mood_scores /= total_pins
 
         return {
             'colors': colors,
@@ -116,146 +267,235 @@ class PinterestAnalyzer:
         """
         Extract dominant colors from Pinterest image
         """
-        try:
-            response = requests.get(image_url)
-            image = Image.open(io.BytesIO(response.content))
-            image = image.convert('RGB')
+        return self.palette_to_hex(await self.extract_palette(image_url))
 
-            # Resize for faster processing
-            image = image.resize((150, 150))
+    async def extract_palette(self, image_url: str) -> np.ndarray:
+        """
+        Extract dominant colors from Pinterest image as a (K, 3) uint8 RGB array
+        """
+        return (await self.extract_palettes([image_url]))[0]
 
-            # Convert to numpy array
-            img_array = np.array(image)
+    async def extract_palettes(self, image_urls: List[str]) -> List[np.ndarray]:
+        """
+        Extract dominant colors for a batch of Pinterest images, one palette per URL
+        """
+        palettes = {}
+        for image_url in image_urls:
+            palette = self._palette_cache.get(image_url)
+            if palette is not None:
+                self._palette_cache.move_to_end(image_url)
+                palettes[image_url] = palette
+
+        # Download and decode every uncached image, then quantize them all at once
+        missing = [image_url for image_url in dict.fromkeys(image_urls) if image_url not in palettes]
+        thumbnails = await asyncio.gather(*(self._load_thumbnail(image_url) for image_url in missing))
+        loaded = [(image_url, thumbnail) for image_url, thumbnail in zip(missing, thumbnails) if thumbnail is not None]
+
+        if loaded:
+            batch = np.stack([thumbnail for _, thumbnail in loaded])
+            for (image_url, _), palette in zip(loaded, self._batch_palettes(batch)):
+                palette.flags.writeable = False  # Shared between callers
+                palettes[image_url] = palette
+                self._palette_cache[image_url] = palette
+                if len(self._palette_cache) > self.PALETTE_CACHE_SIZE:
+                    self._palette_cache.popitem(last=False)
+
+        empty = np.empty((0, 3), dtype=np.uint8)
+        return [palettes.get(image_url, empty) for image_url in image_urls]
+
+    async def _load_thumbnail(self, image_url: str) -> Optional[np.ndarray]:
+        try:
+            async with self._download_semaphore:
+                async with self._get_image_session().get(image_url) as response:
+                    image_data = await response.read()
 
-            # Reshape to list of pixels
-            pixels = img_array.reshape(-1, 3)
+            # Decoding releases the GIL, so images in a batch decode in parallel threads
+            return await asyncio.to_thread(self._decode_thumbnail, image_data)
 
-            # Use k-means clustering to find dominant colors
-            from sklearn.cluster import KMeans
-            kmeans = KMeans(n_clusters=5, random_state=42)
-            kmeans.fit(pixels)
+        except Exception as e:
+            print(f"Error extracting colors: {e}")
+            return None
 
-            # Convert colors to hex
-            dominant_colors = []
-            for color in kmeans.cluster_centers_:
-                hex_color = '#{:02x}{:02x}{:02x}'.format(
-                    int(color[0]), int(color[1]), int(color[2])
-                )
-                dominant_colors.append(hex_color)
+    @staticmethod
+    def _decode_thumbnail(image_data: bytes) -> np.ndarray:
+        image = Image.open(io.BytesIO(image_data))
+        image = image.convert('RGB')
 
-            return dominant_colors
+        # A 50x50 thumbnail keeps the palette and cuts pixels 9x vs 150x150
+        image = image.resize((50, 50), Image.BILINEAR)
 
-        except Exception as e:
-            print(f"Error extracting colors: {e}")
-            return []
+        return np.asarray(image)
 
-    def analyze_image_mood(self, colors: List[str]) -> Dict[str, float]:
+    @staticmethod
+    def _batch_palettes(thumbnails: np.ndarray) -> List[np.ndarray]:
+        """
+        Five most common colors of each image in an (N, 50, 50, 3) uint8 batch
+        """
+        num_images = len(thumbnails)
+        pixels = thumbnails.reshape(num_images, -1, 3)
+
+        # Quantize to 4 bits per channel and count pixels per 16x16x16 color bin
+        quantized = (pixels >> 4).astype(np.intp)
+        bins = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+
+        # Give each image its own 4096 bins so one bincount covers the whole batch
+        bins += np.arange(num_images)[:, None] * 4096
+        counts = np.bincount(bins.ravel(), minlength=num_images * 4096).reshape(num_images, 4096)
+
+        # Five most populated bins per image, most common first
+        top_bins = np.argpartition(counts, -5, axis=1)[:, -5:]
+        top_counts = np.take_along_axis(counts, top_bins, axis=1)
+        order = np.argsort(-top_counts, axis=1, kind='stable')
+        top_bins = np.take_along_axis(top_bins, order, axis=1)
+        top_counts = np.take_along_axis(top_counts, order, axis=1)
+
+        # Decode bins back to their center colors
+        colors = np.stack(
+            ((top_bins >> 8) & 15, (top_bins >> 4) & 15, top_bins & 15),
+            axis=-1
+        ).astype(np.uint8) << 4 | 8
+
+        return [
+            image_colors[image_counts > 0]
+            for image_colors, image_counts in zip(colors, top_counts)
+        ]
+
+    def palette_to_hex(self, palette: np.ndarray) -> List[str]:
+        return ['#{:02x}{:02x}{:02x}'.format(*color) for color in palette.tolist()]
+
+    def analyze_image_mood(self, rgb: np.ndarray) -> Dict[str, float]:
         """
         Analyze mood based on color palette
+        rgb: (K, 3) array of colors with channels in [0, 1]
         """
-        mood_scores = {'romantic': 0, 'dark': 0, 'bright': 0, 'minimalist': 0}
-
-        for hex_color in colors:
-            # Convert hex to RGB
-            rgb = tuple(int(hex_color[i:i+2], 16) for i in (1, 3, 5))
-
-            # Convert to HSV for better analysis
-            hsv = colorsys.rgb_to_hsv(rgb[0]/255, rgb[1]/255, rgb[2]/255)
-            hue, saturation, value = hsv
+        return dict(zip(MOODS, self.mood_vector(rgb).tolist()))
 
-            # Analyze mood based on HSV values
-            if saturation < 0.3 and value > 0.8:  # Light, desaturated
-                mood_scores['minimalist'] += 1
-            elif value < 0.3:  # Dark colors
-                mood_scores['dark'] += 1
-            elif saturation > 0.7 and value > 0.7:  # Bright, saturated
-                mood_scores['bright'] += 1
-            elif 0.8 < hue < 1.0 or 0.0 < hue < 0.1:  # Pink/red hues
-                mood_scores['romantic'] += 1
+    def mood_vector(self, rgb: np.ndarray) -> np.ndarray:
+        """
+        Mood scores of a palette as an array in MOODS order
+        """
+        total_colors = len(rgb)
+        if total_colors == 0:
+            return np.zeros(len(MOODS))
 
         # Normalize scores
-        total_colors = len(colors)
-        if total_colors > 0:
-            for mood in mood_scores:
-                mood_scores[mood] /= total_colors
+        return _mood_counts(_classify_moods(np.ascontiguousarray(rgb, dtype=np.float64))) / total_colors
 
-        return mood_scores
+    def palette_mood_vector(self, palette: np.ndarray) -> np.ndarray:
+        """
+        Same as mood_vector for a uint8 palette from extract_palettes, via the bin lookup table
+        """
+        total_colors = len(palette)
+        if total_colors == 0:
+            return np.zeros(len(MOODS))
+
+        quantized = (palette >> 4).astype(np.intp)
+        bins = (quantized[:, 0] << 8) | (quantized[:, 1] << 4) | quantized[:, 2]
+        return _mood_counts(_MOOD_LUT[bins]) / total_colors
 
     def map_to_book_genres(self, analysis: Dict[str, Any]) -> List[str]:
         """
         Map Pinterest analysis to book genres
         """
-        genre_mapping = []
+        genre_mapping: Set[str] = set()
 
         # Mood-based mapping
         mood_profile = analysis['mood_profile']
 
         if mood_profile.get('romantic', 0) > 0.3:
-            genre_mapping.append('Romance')
+            genre_mapping.add('Romance')
 
         if mood_profile.get('dark', 0) > 0.4:
-            genre_mapping.extend(['Horror', 'Mystery', 'Thriller'])
+            genre_mapping.update(['Horror', 'Mystery', 'Thriller'])
 
         if mood_profile.get('bright', 0) > 0.4:
-            genre_mapping.extend(['Comedy', 'Adventure'])
+            genre_mapping.update(['Comedy', 'Adventure'])
 
         if mood_profile.get('minimalist', 0) > 0.3:
-            genre_mapping.extend(['Literary Fiction', 'Philosophy'])
-
-        # Keyword-based mapping
-        keywords = analysis['interest_keywords']
-        keyword_genre_map = {
-            'vintage': ['Historical Fiction'],
-            'nature': ['Adventure', 'Environmental'],
-            'travel': ['Adventure', 'Travel'],
-            'art': ['Art', 'Biography'],
-            'fashion': ['Contemporary Fiction'],
-            'food': ['Cooking', 'Memoir'],
-            'quotes': ['Poetry', 'Philosophy']
-        }
+            genre_mapping.update(['Literary Fiction', 'Philosophy'])
 
-        for keyword in keywords:
-            for key, genres in keyword_genre_map.items():
-                if key in keyword.lower():
-                    genre_mapping.extend(genres)
+        # Keyword-based mapping, each distinct keyword lowercased once
+        keywords = {keyword.lower() for keyword in analysis['interest_keywords']}
 
-        return list(set(genre_mapping))  # Remove duplicates
+        for key, genres in KEYWORD_GENRE_MAP.items():
+            if any(key in keyword for keyword in keywords):
+                genre_mapping.update(genres)
+
+        return list(genre_mapping)
 
 class SpotifyAnalyzer:
+    # Maximum ids accepted by the audio-features endpoint per request
+    AUDIO_FEATURES_BATCH_SIZE = 100
+
     def __init__(self, client_id: str, client_secret: str):
         self.client_id = client_id
         self.client_secret = client_secret
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Keeps concurrent playlist fetches under Spotify's rate limits
+        self._playlist_semaphore = asyncio.Semaphore(10)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Shared API session, created on first use inside the running event loop
+        """
+        if self._session is None or self._session.closed:
+            self._session = _create_session(limit_per_host=8)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
     async def analyze_spotify_preferences(self, access_token: str) -> Dict[str, Any]:
         """
         Analyze Spotify listening habits for book recommendations
         """
-        playlists = await self.get_user_playlists(access_token)
-        top_tracks = await self.get_user_top_tracks(access_token)
+        playlists, top_tracks = await asyncio.gather(
+            self.get_user_playlists(access_token),
+            self.get_user_top_tracks(access_token)
+        )
 
         analysis = {
-            'genre_preferences': {},
-            'mood_profile': {},
+            'genre_preferences': defaultdict(int),
+            'mood_profile': defaultdict(int),
             'energy_level': 0,
             'complexity_preference': 0,
             'book_genre_mapping': []
         }
 
-        all_tracks = []
-
-        # Analyze playlists
-        for playlist in playlists:
-            tracks = await self.get_playlist_tracks(playlist['id'], access_token)
-            all_tracks.extend(tracks)
+        # Analyze playlists, fetched concurrently
+        track_lists = await asyncio.gather(
+            *(self._get_playlist_tracks_bounded(playlist['id'], access_token) for playlist in playlists)
+        )
+        all_tracks = [track for tracks in track_lists for track in tracks]
 
         # Add top tracks
         all_tracks.extend(top_tracks)
 
-        # Analyze audio features
-        for track in all_tracks:
-            audio_features = await self.get_audio_features(track['id'], access_token)
-            if audio_features:
-                self.update_analysis_with_track(analysis, track, audio_features)
+        # Analyze audio features, fetched 100 tracks per request
+        # (local files and removed tracks have no id)
+        track_ids = list(dict.fromkeys(track['id'] for track in all_tracks if track and track.get('id')))
+        batches = await asyncio.gather(*(
+            self.get_audio_features_batch(track_ids[i:i + self.AUDIO_FEATURES_BATCH_SIZE], access_token)
+            for i in range(0, len(track_ids), self.AUDIO_FEATURES_BATCH_SIZE)
+        ))
+        # Match features by id; a response may hold fewer entries than requested
+        features_by_id = {
+            features['id']: features
+            for batch in batches for features in batch
+            if features and features.get('id')
+        }
+
+        analyzed = [
+            (track, features_by_id[track['id']])
+            for track in all_tracks
+            if track and track.get('id') in features_by_id
+        ]
+        self.update_analysis_with_tracks(
+            analysis,
+            [track for track, _ in analyzed],
+            [audio_features for _, audio_features in analyzed]
+        )
 
         # Normalize scores
         total_tracks = len(all_tracks)
@@ -266,94 +506,112 @@ class SpotifyAnalyzer:
             for mood in analysis['mood_profile']:
                 analysis['mood_profile'][mood] /= total_tracks
 
+        # Plain dicts for serialization
+        analysis['genre_preferences'] = dict(analysis['genre_preferences'])
+        analysis['mood_profile'] = dict(analysis['mood_profile'])
+
         # Map to book genres
         analysis['book_genre_mapping'] = self.map_music_to_book_genres(analysis)
 
         return analysis
 
-    def update_analysis_with_track(
+    async def _get_playlist_tracks_bounded(self, playlist_id: str, access_token: str) -> List[Dict]:
+        async with self._playlist_semaphore:
+            return await self.get_playlist_tracks(playlist_id, access_token)
+
+    async def get_audio_features_batch(self, track_ids: List[str], access_token: str) -> List[Optional[Dict]]:
+        """
+        Fetch audio features for up to 100 tracks, in the same order as track_ids
+        """
+        headers = {'Authorization': f'Bearer {access_token}'}
+        async with self._get_session().get(
+            'https://api.spotify.com/v1/audio-features',
+            params={'ids': ','.join(track_ids)},
+            headers=headers
+        ) as response:
+            if response.status == 200:
+                return (await response.json()).get('audio_features', [])
+            return [None] * len(track_ids)
+
+    def update_analysis_with_tracks(
         self,
         analysis: Dict,
-        track: Dict,
-        audio_features: Dict
+        tracks: List[Dict],
+        audio_features: List[Dict]
     ):
         """
-        Update analysis with individual track data
+        Update analysis with the data of all tracks at once
+        (genre_preferences and mood_profile are defaultdict(int))
         """
+        # Columns: energy, valence, instrumentalness, acousticness
+        features = np.array([
+            [
+                track_features.get('energy', 0),
+                track_features.get('valence', 0),
+                track_features.get('instrumentalness', 0),
+                track_features.get('acousticness', 0)
+            ]
+            for track_features in audio_features
+        ], dtype=np.float64).reshape(-1, 4)
+        energy, valence, instrumentalness, acousticness = features.T
+
         # Energy level
-        analysis['energy_level'] += audio_features.get('energy', 0)
+        analysis['energy_level'] += energy.sum()
 
         # Complexity (based on instrumentalness and acousticness)
-        complexity = (
-            audio_features.get('instrumentalness', 0) * 0.6 +
-            audio_features.get('acousticness', 0) * 0.4
-        )
-        analysis['complexity_preference'] += complexity
+        analysis['complexity_preference'] += (instrumentalness * 0.6 + acousticness * 0.4).sum()
 
         # Mood analysis
-        valence = audio_features.get('valence', 0)
-        energy = audio_features.get('energy', 0)
-
-        if valence > 0.7:
-            analysis['mood_profile']['happy'] = analysis['mood_profile'].get('happy', 0) + 1
-        elif valence < 0.3:
-            analysis['mood_profile']['melancholy'] = analysis['mood_profile'].get('melancholy', 0) + 1
-
-        if energy > 0.7:
-            analysis['mood_profile']['energetic'] = analysis['mood_profile'].get('energetic', 0) + 1
-        elif energy < 0.3:
-            analysis['mood_profile']['calm'] = analysis['mood_profile'].get('calm', 0) + 1
+        mood_counts = {
+            'happy': np.count_nonzero(valence > 0.7),
+            'melancholy': np.count_nonzero(valence < 0.3),
+            'energetic': np.count_nonzero(energy > 0.7),
+            'calm': np.count_nonzero(energy < 0.3)
+        }
+        for mood, count in mood_counts.items():
+            if count:
+                analysis['mood_profile'][mood] += int(count)
 
         # Genre preferences
-        for artist in track.get('artists', []):
-            genres = artist.get('genres', [])
-            for genre in genres:
-                analysis['genre_preferences'][genre] = (
-                    analysis['genre_preferences'].get(genre, 0) + 1
-                )
+        genre_counts = Counter(
+            genre
+            for track in tracks
+            for artist in track.get('artists', [])
+            for genre in artist.get('genres', [])
+        )
+        for genre, count in genre_counts.items():
+            analysis['genre_preferences'][genre] += count
 
     def map_music_to_book_genres(self, analysis: Dict) -> List[str]:
         """
         Map music preferences to book genres
         """
-        book_genres = []
+        book_genres: Set[str] = set()
 
         # Energy-based mapping
         energy = analysis['energy_level']
         if energy > 0.7:
-            book_genres.extend(['Action', 'Adventure', 'Thriller'])
+            book_genres.update(['Action', 'Adventure', 'Thriller'])
         elif energy < 0.3:
-            book_genres.extend(['Literary Fiction', 'Poetry', 'Philosophy'])
+            book_genres.update(['Literary Fiction', 'Poetry', 'Philosophy'])
 
         # Mood-based mapping
         mood_profile = analysis['mood_profile']
 
         if mood_profile.get('happy', 0) > 0.4:
-            book_genres.extend(['Comedy', 'Romance', 'Feel-good Fiction'])
+            book_genres.update(['Comedy', 'Romance', 'Feel-good Fiction'])
 
         if mood_profile.get('melancholy', 0) > 0.4:
-            book_genres.extend(['Drama', 'Literary Fiction', 'Memoir'])
+            book_genres.update(['Drama', 'Literary Fiction', 'Memoir'])
 
         if mood_profile.get('calm', 0) > 0.4:
-            book_genres.extend(['Meditation', 'Nature Writing', 'Poetry'])
+            book_genres.update(['Meditation', 'Nature Writing', 'Poetry'])
 
         # Music genre to book genre mapping
-        music_genres = analysis['genre_preferences']
-
-        genre_mapping = {
-            'classical': ['Classical Literature', 'Philosophy', 'History'],
-            'jazz': ['Beat Literature', 'Biography', 'Music'],
-            'rock': ['Counterculture', 'Biography', 'Music'],
-            'electronic': ['Science Fiction', 'Cyberpunk', 'Futurism'],
-            'folk': ['Historical Fiction', 'Nature Writing', 'Americana'],
-            'hip-hop': ['Urban Fiction', 'Social Commentary', 'Biography'],
-            'country': ['Southern Fiction', 'Americana', 'Rural Life'],
-            'indie': ['Independent Literature', 'Alternative Fiction']
-        }
+        music_genres = {music_genre.lower() for music_genre in analysis['genre_preferences']}
 
-        for music_genre, count in music_genres.items():
-            for key, book_genre_list in genre_mapping.items():
-                if key in music_genre.lower():
-                    book_genres.extend(book_genre_list)
+        for key, book_genre_list in MUSIC_GENRE_MAP.items():
+            if any(key in music_genre for music_genre in music_genres):
+                book_genres.update(book_genre_list)
 
-        return list(set(book_genres))
+        return list(book_genres)
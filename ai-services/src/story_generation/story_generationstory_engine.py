@@ -1,10 +1,36 @@
 # ai-services/src/story_generation/story_engine.py
 import openai
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Any, AsyncIterator, Tuple, Union
+import orjson
+import re
 import asyncio
 from dataclasses import dataclass
 
+# Opening of the "content" string in a streamed story response
+_CONTENT_START = re.compile(r'"content"\s*:\s*"')
+
+def _scan_json_string(text: str, pos: int) -> Tuple[int, bool]:
+    """
+    Find how far the JSON string body starting at pos can be decoded.
+    Returns the end offset and whether the closing quote was reached
+    """
+    end = len(text)
+    while pos < end:
+        char = text[pos]
+        if char == '"':
+            return pos, True
+        if char == '\\':
+            width = 2
+            if text[pos + 1:pos + 2] == 'u':
+                # Keep surrogate pairs together so they decode to one character
+                width = 12 if text[pos + 2:pos + 4].lower() in ('d8', 'd9', 'da', 'db') else 6
+            if pos + width > end:
+                break
+            pos += width
+        else:
+            pos += 1
+    return pos, False
+
 @dataclass
 class StoryChoice:
     id: int
@@ -19,6 +45,47 @@ class StorySegment:
     metadata: Dict[str, Any]
 
 class StoryGenerationEngine:
+    # Sent unchanged as the first message of every story call so the provider
+    # can reuse its cached prefix; per-turn details go in the user message
+    SYSTEM_PROMPT = """
+        You are a master storyteller specializing in interactive fiction. Your role is to:
+
+        1. Create engaging, immersive narratives that draw readers in
+        2. Maintain consistency in character development and world-building
+        3. Generate meaningful choices that impact story direction
+        4. Adapt writing style to match genre conventions
+        5. Balance description, dialogue, and action appropriately
+        6. Create natural cliffhangers that encourage continued reading
+
+        After each story segment, offer exactly 3 distinct choices for how the story could continue.
+        Each choice should:
+        - Lead to meaningfully different story paths
+        - Be appropriate for the story's genre
+        - Have clear consequences for character development
+        - Maintain story momentum
+
+        Always respond in valid JSON format as requested.
+        Ensure all content is appropriate for the specified rating.
+        Focus on quality storytelling over quantity of text.
+
+        Format your response as JSON:
+        {
+            "content": "The story text here...",
+            "mood": "mysterious/exciting/romantic/etc",
+            "complexity": "simple/medium/complex",
+            "themes": ["theme1", "theme2"],
+            "choices": [
+                {
+                    "id": 1,
+                    "text": "Brief choice description",
+                    "description": "Detailed explanation of this choice",
+                    "consequences": "What this choice might lead to"
+                },
+                // ... 2 more choices
+            ]
+        }
+        """
+
     def __init__(self, api_key: str):
         openai.api_key = api_key
         self.model = "gpt-4-turbo-preview"
@@ -38,19 +105,73 @@ class StoryGenerationEngine:
         response = await openai.ChatCompletion.acreate(
             model=self.model,
             messages=[
-                {"role": "system", "content": self.get_system_prompt()},
+                {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.8,
-            max_tokens=1000
+            max_tokens=1500,
+            response_format={"type": "json_object"}
         )
 
         story_data = self.parse_story_response(response.choices[0].message.content)
-        choices = await self.generate_choices(story_data['content'], genre)
+        return self.create_initial_segment(story_data, genre)
+
+    async def generate_initial_story_stream(
+        self,
+        genre: str,
+        characters: str,
+        setting: str,
+        user_preferences: Dict[str, Any]
+    ) -> AsyncIterator[Union[str, StorySegment]]:
+        """
+        Stream the opening segment of an interactive story.
+        Yields narrative text as it is generated, then the finished StorySegment
+        """
+        prompt = self.create_initial_prompt(genre, characters, setting, user_preferences)
+
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.8,
+            max_tokens=1500,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+
+        buffer = ''
+        emitted = None  # Offset of the first content character not yet yielded
+        content_done = False
 
+        async for chunk in response:
+            delta = chunk.choices[0].delta.get('content')
+            if not delta:
+                continue
+            buffer += delta
+
+            if content_done:
+                continue
+            if emitted is None:
+                match = _CONTENT_START.search(buffer)
+                if match is None:
+                    continue
+                emitted = match.end()
+
+            end, content_done = _scan_json_string(buffer, emitted)
+            if end > emitted:
+                yield orjson.loads('"' + buffer[emitted:end] + '"')
+                emitted = end
+
+        # Metadata and choices only need the full response parsed once
+        story_data = self.parse_story_response(buffer)
+        yield self.create_initial_segment(story_data, genre)
+
+    def create_initial_segment(self, story_data: Dict[str, Any], genre: str) -> StorySegment:
         return StorySegment(
             content=story_data['content'],
-            choices=choices,
+            choices=self.parse_choices(story_data),
             metadata={
                 'genre': genre,
                 'mood': story_data.get('mood', 'neutral'),
@@ -74,14 +195,6 @@ class StoryGenerationEngine:
         - End with a situation requiring a decision
         - Use vivid, engaging language
         - Maintain appropriate tone for the genre
-
-        Format your response as JSON:
-        {{
-            "content": "The story text here...",
-            "mood": "mysterious/exciting/romantic/etc",
-            "complexity": "simple/medium/complex",
-            "themes": ["theme1", "theme2"]
-        }}
         """
 
     async def generate_choices(self, story_content: str, genre: str) -> List[StoryChoice]:
@@ -121,7 +234,7 @@ class StoryGenerationEngine:
             max_tokens=500
         )
 
-        choices_data = json.loads(response.choices[0].message.content)
+        choices_data = orjson.loads(response.choices[0].message.content)
         return [StoryChoice(**choice) for choice in choices_data['choices']]
 
     async def continue_story(
@@ -133,19 +246,9 @@ class StoryGenerationEngine:
         """
         Continue the story based on user's choice
         """
+        # Fixed instructions first so consecutive turns share a longer prompt prefix
         prompt = f"""
-        Previous story content:
-        {previous_content}
-
-        User chose: {chosen_choice.text}
-        Choice description: {chosen_choice.description}
-
-        Story context:
-        - Genre: {story_context.get('genre')}
-        - Current mood: {story_context.get('mood')}
-        - Themes: {story_context.get('themes', [])}
-
-        Continue the story based on this choice:
+        Continue the story based on the user's choice below:
         - Write 2-3 paragraphs showing the consequences of the choice
         - Advance the plot meaningfully
         - Maintain character consistency
@@ -153,49 +256,53 @@ class StoryGenerationEngine:
         - End with another decision point
         - Keep the same writing style and tone
 
-        Format as JSON with the same structure as before.
+        Story context:
+        - Genre: {story_context.get('genre')}
+        - Current mood: {story_context.get('mood')}
+        - Themes: {story_context.get('themes', [])}
+
+        Previous story content:
+        {previous_content}
+
+        User chose: {chosen_choice.text}
+        Choice description: {chosen_choice.description}
         """
 
         response = await openai.ChatCompletion.acreate(
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
             temperature=0.8,
-            max_tokens=800
+            max_tokens=1300,
+            response_format={"type": "json_object"}
         )
 
         story_data = self.parse_story_response(response.choices[0].message.content)
-        new_choices = await self.generate_choices(story_data['content'], story_context['genre'])
 
         return StorySegment(
             content=story_data['content'],
-            choices=new_choices,
+            choices=self.parse_choices(story_data),
             metadata=story_context
         )
 
     def get_system_prompt(self) -> str:
-        return """
-        You are a master storyteller specializing in interactive fiction. Your role is to:
-
-        1. Create engaging, immersive narratives that draw readers in
-        2. Maintain consistency in character development and world-building
-        3. Generate meaningful choices that impact story direction
-        4. Adapt writing style to match genre conventions
-        5. Balance description, dialogue, and action appropriately
-        6. Create natural cliffhangers that encourage continued reading
-
-        Always respond in valid JSON format as requested.
-        Ensure all content is appropriate for the specified rating.
-        Focus on quality storytelling over quantity of text.
-        """
+        return self.SYSTEM_PROMPT
 
     def parse_story_response(self, response: str) -> Dict[str, Any]:
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # Fallback parsing if JSON is malformed
+            return orjson.loads(response)
+        except orjson.JSONDecodeError:
+            # JSON mode guarantees valid syntax, so this only happens when
+            # the response was cut off at max_tokens
             return {
                 'content': response,
                 'mood': 'neutral',
                 'complexity': 'medium',
-                'themes': []
+                'themes': [],
+                'choices': []
             }
+
+    def parse_choices(self, story_data: Dict[str, Any]) -> List[StoryChoice]:
+        return [StoryChoice(**choice) for choice in story_data.get('choices', [])]
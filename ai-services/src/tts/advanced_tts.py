@@ -1,11 +1,113 @@
 # ai-services/src/tts/advanced_tts.py
 import azure.cognitiveservices.speech as speechsdk
 import re
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Final, List, Optional, Tuple
 from dataclasses import dataclass
 import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from tts.synthesis_cache import SynthesisCache
+from tts.synthesizer_pool import SynthesizerPool
+
+# Azure credentials, read once; get_engine reports them missing on first use
+_SPEECH_KEY = os.environ.get("AZURE_SPEECH_KEY")
+_SPEECH_REGION = os.environ.get("AZURE_SPEECH_REGION")
+
+# Upper bound on Azure synthesis calls in flight, so bursts queue here instead of being throttled
+_AZURE_CONCURRENCY = int(os.getenv("AZURE_TTS_CONCURRENCY", "3"))
+
+# Everything enhance_text_for_speech rewrites, matched in a single pass.
+# A closing quote may be followed by a dialogue attribution ("Hello," she said)
+_SPEECH_RE = re.compile(
+    r'(?P<chapter>Chapter (?P<chapter_number>\d+))'
+    r'|(?P<quote>"[^"]*")(?P<attribution> (?:he|she|they) (?:said|asked|replied|whispered|shouted))?'
+    r'|(?P<italic>\*[^*]*\*)'
+    r'|(?P<pause>[.,;:?!])'
+)
 
-@dataclass
+# Pauses after punctuation
+_PAUSES = {
+    '.': '.<break time="600ms"/>',
+    ',': ',<break time="300ms"/>',
+    ';': ';<break time="400ms"/>',
+    ':': ':<break time="300ms"/>',
+    '?': '?<break time="700ms"/>',
+    '!': '!<break time="700ms"/>'
+}
+
+def _speech_replacement(match: re.Match) -> str:
+    kind = match.lastgroup
+    matched = match.group()
+
+    if kind == 'pause':
+        return _PAUSES[matched]
+
+    # Add emphasis for quoted speech
+    if kind in ('quote', 'attribution'):
+        quoted = match.group('quote')[1:-1]
+        attribution = match.group('attribution')
+        if attribution and quoted.endswith(','):
+            # Handle dialogue attribution with a shorter pause than a plain comma
+            spoken = _SPEECH_RE.sub(_speech_replacement, quoted[:-1]) + ',<break time="200ms"/>'
+        else:
+            spoken = _SPEECH_RE.sub(_speech_replacement, quoted)
+        return f'<emphasis level="moderate">"{spoken}"</emphasis>{attribution or ""}'
+
+    # Add emphasis for italicized text (assuming *text* format)
+    if kind == 'italic':
+        return f'<emphasis level="strong">{_SPEECH_RE.sub(_speech_replacement, matched[1:-1])}</emphasis>'
+
+    # Handle chapter breaks
+    return f'<break time="2s"/>Chapter <say-as interpret-as="cardinal">{match.group("chapter_number")}</say-as><break time="1s"/>'
+
+@lru_cache(maxsize=1024)
+def _enhance_text_for_speech(text: str) -> str:
+    """
+    Enhance text with natural speech patterns and pauses (pure, so results are cached)
+    """
+    return _SPEECH_RE.sub(_speech_replacement, text)
+
+@lru_cache(maxsize=256)
+def _ssml_header(voice_name: str, style_attribute: str, speaking_rate: float, pitch: str) -> str:
+    """
+    Opening SSML markup up to the spoken text, shared by every document with the same voice settings
+    """
+    return (
+        '<speak version="1.0" xmlns="<http://www.w3.org/2001/10/synthesis>" '
+        'xmlns:mstts="<https://www.w3.org/2001/mstts>" xml:lang="en-US">'
+        f'<voice name="{voice_name}">'
+        f'<mstts:express-as {style_attribute}>'
+        f'<prosody rate="{speaking_rate}" pitch="{pitch}">'
+    )
+
+_SSML_FOOTER = '</prosody></mstts:express-as></voice></speak>'
+_SSML_CHAPTER_END_FOOTER = '</prosody></mstts:express-as><break time="3s"/></voice></speak>'
+
+# Whitespace following the end of a sentence, allowing for a closing quote or bracket
+_SENTENCE_BREAK = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+')
+
+def _chunk_sentences(text: str, max_chars: int = 500) -> List[str]:
+    """
+    Group whole sentences into chunks of at most max_chars characters.
+    A single sentence longer than max_chars becomes a chunk of its own, and
+    a chunk is never closed inside an open quote or italic span
+    """
+    chunks = []
+    current = ''
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        # Quotes and italics are paired per chunk, so an odd count must carry on
+        balanced = current.count('"') % 2 == 0 and current.count('*') % 2 == 0
+        if current and balanced and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+@dataclass(frozen=True, slots=True)
 class VoiceProfile:
     name: str
     gender: str
@@ -14,44 +116,111 @@ class VoiceProfile:
     personality: str
     sample_rate: int = 24000
 
+# Available voice profiles
+_VOICE_PROFILES: Final[Dict[str, VoiceProfile]] = {
+    'jenny_professional': VoiceProfile(
+        name='en-US-JennyNeural',
+        gender='female',
+        age_range='adult',
+        accent='american',
+        personality='professional'
+    ),
+    'aria_warm': VoiceProfile(
+        name='en-US-AriaNeural',
+        gender='female',
+        age_range='young_adult',
+        accent='american',
+        personality='warm'
+    ),
+    'guy_friendly': VoiceProfile(
+        name='en-US-GuyNeural',
+        gender='male',
+        age_range='adult',
+        accent='american',
+        personality='friendly'
+    ),
+    'davis_authoritative': VoiceProfile(
+        name='en-US-DavisNeural',
+        gender='male',
+        age_range='mature',
+        accent='american',
+        personality='authoritative'
+    )
+}
+
+# Map emotions to SSML styles
+_EMOTION_STYLES: Final[Dict[str, str]] = {
+    'neutral': '',
+    'cheerful': 'style="cheerful"',
+    'sad': 'style="sad"',
+    'angry': 'style="angry"',
+    'fearful': 'style="fearful"',
+    'excited': 'style="excited"',
+    'friendly': 'style="friendly"',
+    'hopeful': 'style="hopeful"',
+    'shouting': 'style="shouting"',
+    'terrified': 'style="terrified"',
+    'unfriendly': 'style="unfriendly"',
+    'whispering': 'style="whispering"'
+}
+
+# Emotion keywords in priority order, matched anywhere in the text
+_EMOTION_KEYWORDS: Final[Dict[str, Tuple[str, ...]]] = {
+    'excited': ('amazing', 'incredible', 'fantastic', 'wonderful'),
+    'sad': ('sad', 'tragic', 'sorrow', 'grief', 'died', 'death'),
+    'fearful': ('scared', 'terrified', 'afraid', 'horror', 'nightmare'),
+    'angry': ('angry', 'furious', 'rage', 'hate', 'damn'),
+    'cheerful': ('happy', 'joy', 'laugh', 'smile', 'cheerful')
+}
+_EMOTION_PRIORITY: Final[Dict[str, int]] = {emotion: rank for rank, emotion in enumerate(_EMOTION_KEYWORDS)}
+_WORD_TO_EMOTION: Final[Dict[str, str]] = {
+    word: emotion for emotion, words in _EMOTION_KEYWORDS.items() for word in words
+}
+# Lookahead so overlapping keywords are all found, as separate substring checks would
+_EMOTION_RE = re.compile(
+    r'(?=(' + '|'.join(re.escape(word) for word in _WORD_TO_EMOTION) + r'))',
+    re.IGNORECASE
+)
+
+# Output formats a request may choose, and the media type each is served as
+_OUTPUT_FORMATS: Final[Dict[str, speechsdk.SpeechSynthesisOutputFormat]] = {
+    'Audio16Khz32KBitRateMonoMp3': speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3,
+    'Audio24Khz48KBitRateMonoMp3': speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3,
+    'Ogg48Khz16BitMonoOpus': speechsdk.SpeechSynthesisOutputFormat.Ogg48Khz16BitMonoOpus
+}
+_MEDIA_TYPES: Final[Dict[str, str]] = {
+    'Audio16Khz32KBitRateMonoMp3': 'audio/mpeg',
+    'Audio24Khz48KBitRateMonoMp3': 'audio/mpeg',
+    'Ogg48Khz16BitMonoOpus': 'audio/ogg'
+}
+
+def _set_output_format(speech_config: speechsdk.SpeechConfig, output_format: str):
+    speech_config.set_speech_synthesis_output_format(_OUTPUT_FORMATS[output_format])
+
 class AdvancedTTSEngine:
+    # Bytes read from Azure per streamed chunk
+    STREAM_CHUNK_SIZE = 3200
+    # Chapter pieces one audiobook request may have in flight
+    CHAPTER_CONCURRENCY = 4
+    # Audiobook exports keep the higher quality; constant bitrate lets pieces be concatenated
+    AUDIOBOOK_FORMAT = 'Audio24Khz48KBitRateMonoMp3'
+
     def __init__(self, speech_key: str, speech_region: str):
-        self.speech_config = speechsdk.SpeechConfig(
-            subscription=speech_key,
-            region=speech_region
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+
+        # Connected synthesizers per (voice, output format), shared by every request
+        self._synth_pool = SynthesizerPool(
+            speech_key,
+            speech_region,
+            _AZURE_CONCURRENCY,
+            _set_output_format
         )
 
-        # Available voice profiles
-        self.voice_profiles = {
-            'jenny_professional': VoiceProfile(
-                name='en-US-JennyNeural',
-                gender='female',
-                age_range='adult',
-                accent='american',
-                personality='professional'
-            ),
-            'aria_warm': VoiceProfile(
-                name='en-US-AriaNeural',
-                gender='female',
-                age_range='young_adult',
-                accent='american',
-                personality='warm'
-            ),
-            'guy_friendly': VoiceProfile(
-                name='en-US-GuyNeural',
-                gender='male',
-                age_range='adult',
-                accent='american',
-                personality='friendly'
-            ),
-            'davis_authoritative': VoiceProfile(
-                name='en-US-DavisNeural',
-                gender='male',
-                age_range='mature',
-                accent='american',
-                personality='authoritative'
-            )
-        }
+        # Repeated phrases (intros, "Chapter N.", common lines) skip Azure entirely
+        self.synthesis_cache = SynthesisCache(max_entries=256)
+        # Chapter pieces are large, so they get their own cache rather than evicting short phrases
+        self.chapter_piece_cache = SynthesisCache(max_entries=128)
 
     async def synthesize_with_emotions(
         self,
@@ -59,35 +228,116 @@ class AdvancedTTSEngine:
         voice_profile: str,
         emotion: str = 'neutral',
         speaking_rate: float = 1.0,
-        pitch: str = 'medium'
+        pitch: str = 'medium',
+        output_format: str = 'Audio24Khz48KBitRateMonoMp3'
     ) -> bytes:
         """
         Synthesize speech with emotional expression
         """
-        voice = self.voice_profiles.get(voice_profile, self.voice_profiles['jenny_professional'])
+        cache_key = SynthesisCache.make_key(text, voice_profile, emotion, speaking_rate, pitch, output_format)
+        cached_audio = self.synthesis_cache.get(cache_key)
+        if cached_audio is not None:
+            return cached_audio
+
+        voice = _VOICE_PROFILES.get(voice_profile, _VOICE_PROFILES['jenny_professional'])
 
         # Create enhanced SSML with emotions
         ssml = self.create_emotional_ssml(text, voice, emotion, speaking_rate, pitch)
 
-        # Configure speech synthesizer
-        self.speech_config.speech_synthesis_voice_name = voice.name
-        self.speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3
-        )
+        audio_data = await self.synthesize_ssml(ssml, voice.name, output_format)
+        self.synthesis_cache.put(cache_key, audio_data)
+        return audio_data
 
-        synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=None
-        )
-
-        # Synthesize speech
-        result = synthesizer.speak_ssml_async(ssml).get()
+    async def synthesize_ssml(
+        self,
+        ssml: str,
+        voice_name: str,
+        output_format: str = 'Audio24Khz48KBitRateMonoMp3'
+    ) -> bytes:
+        """
+        Synthesize a complete SSML document with the given voice
+        """
+        # Synthesize speech off the event loop
+        async with self._synth_pool.checkout(voice_name, output_format) as synthesizer:
+            result = await self._synth_pool.run(synthesizer, lambda: synthesizer.speak_ssml_async(ssml).get())
 
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
             return result.audio_data
         else:
             raise Exception(f"Speech synthesis failed: {result.reason}")
 
+    async def stream_with_emotions(
+        self,
+        text: str,
+        voice_profile: str,
+        emotion: str = 'neutral',
+        speaking_rate: float = 1.0,
+        pitch: str = 'medium',
+        output_format: str = 'Audio24Khz48KBitRateMonoMp3'
+    ) -> AsyncIterator[bytes]:
+        """
+        Synthesize speech with emotional expression, yielding audio as Azure produces it
+        """
+        cache_key = SynthesisCache.make_key(text, voice_profile, emotion, speaking_rate, pitch, output_format)
+        cached_audio = self.synthesis_cache.get(cache_key)
+        if cached_audio is not None:
+            yield cached_audio
+            return
+
+        voice = _VOICE_PROFILES.get(voice_profile, _VOICE_PROFILES['jenny_professional'])
+        ssml = self.create_emotional_ssml(text, voice, emotion, speaking_rate, pitch)
+
+        # Azure's output is read into a queue by a separate task, so the slot is held for
+        # exactly as long as Azure is synthesizing, however slowly the client reads
+        audio_queue: asyncio.Queue = asyncio.Queue()
+
+        async def read_audio():
+            try:
+                async with self._synth_pool.checkout(voice.name, output_format) as synthesizer:
+                    # Returns once synthesis has started rather than when it completes
+                    result = await self._synth_pool.run(synthesizer, lambda: synthesizer.start_speaking_ssml_async(ssml).get())
+                    if result.reason != speechsdk.ResultReason.SynthesizingAudioStarted:
+                        raise Exception(f"Speech synthesis failed: {result.reason}")
+
+                    stream = speechsdk.AudioDataStream(result)
+                    while True:
+                        # Fresh buffer per read: the SDK fills it in place, and a full-length
+                        # slice of bytes is the same object rather than a copy
+                        buffer = bytes(self.STREAM_CHUNK_SIZE)
+                        filled = await self._synth_pool.run(synthesizer, lambda: stream.read_data(buffer))
+                        if filled == 0:
+                            break
+                        audio_queue.put_nowait(buffer[:filled])
+
+                    if stream.status != speechsdk.StreamStatus.AllData:
+                        raise Exception(f"Speech synthesis failed: {stream.status}")
+                audio_queue.put_nowait(None)
+            except Exception as e:
+                audio_queue.put_nowait(e)
+
+        reader = asyncio.create_task(read_audio())
+        chunks = []
+        try:
+            while True:
+                chunk = await audio_queue.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # The client went away or synthesis failed; free the Azure slot
+            reader.cancel()
+
+        self.synthesis_cache.put(cache_key, b''.join(chunks))
+
+    async def close(self):
+        """
+        Stop the keepalive loop and close pooled connections
+        """
+        await self._synth_pool.close()
+
     def create_emotional_ssml(
         self,
         text: str,
@@ -102,109 +352,39 @@ class AdvancedTTSEngine:
         # Preprocess text for better speech
         enhanced_text = self.enhance_text_for_speech(text)
 
-        # Map emotions to SSML styles
-        emotion_styles = {
-            'neutral': '',
-            'cheerful': 'style="cheerful"',
-            'sad': 'style="sad"',
-            'angry': 'style="angry"',
-            'fearful': 'style="fearful"',
-            'excited': 'style="excited"',
-            'friendly': 'style="friendly"',
-            'hopeful': 'style="hopeful"',
-            'shouting': 'style="shouting"',
-            'terrified': 'style="terrified"',
-            'unfriendly': 'style="unfriendly"',
-            'whispering': 'style="whispering"'
-        }
+        style_attribute = _EMOTION_STYLES.get(emotion, '')
 
-        style_attribute = emotion_styles.get(emotion, '')
-
-        ssml = f"""
-        <speak version="1.0" xmlns="<http://www.w3.org/2001/10/synthesis>"
-               xmlns:mstts="<https://www.w3.org/2001/mstts>" xml:lang="en-US">
-            <voice name="{voice.name}">
-                <mstts:express-as {style_attribute}>
-                    <prosody rate="{speaking_rate}" pitch="{pitch}">
-                        {enhanced_text}
-                    </prosody>
-                </mstts:express-as>
-            </voice>
-        </speak>
-        """
-
-        return ssml
+        return ''.join((
+            _ssml_header(voice.name, style_attribute, speaking_rate, pitch),
+            enhanced_text,
+            _SSML_FOOTER
+        ))
 
     def enhance_text_for_speech(self, text: str) -> str:
         """
         Enhance text with natural speech patterns and pauses
         """
-        # Add pauses for punctuation
-        text = re.sub(r'\\.', '.<break time="600ms"/>', text)
-        text = re.sub(r',', ',<break time="300ms"/>', text)
-        text = re.sub(r';', ';<break time="400ms"/>', text)
-        text = re.sub(r':', ':<break time="300ms"/>', text)
-        text = re.sub(r'\\?', '?<break time="700ms"/>', text)
-        text = re.sub(r'!', '!<break time="700ms"/>', text)
-
-        # Add emphasis for quoted speech
-        text = re.sub(
-            r'"([^"]*)"',
-            r'<emphasis level="moderate">"\\1"</emphasis>',
-            text
-        )
-
-        # Add emphasis for italicized text (assuming *text* format)
-        text = re.sub(
-            r'\\*([^*]*)\\*',
-            r'<emphasis level="strong">\\1</emphasis>',
-            text
-        )
-
-        # Handle chapter breaks
-        text = re.sub(
-            r'Chapter \\d+',
-            r'<break time="2s"/>Chapter <say-as interpret-as="cardinal">\\g<0></say-as><break time="1s"/>',
-            text
-        )
+        return _enhance_text_for_speech(text)
 
-        # Handle dialogue attribution
-        text = re.sub(
-            r'," (he|she|they) (said|asked|replied|whispered|shouted)',
-            r',<break time="200ms"/> \\1 \\2',
-            text
-        )
-
-        return text
-
-    async def analyze_text_emotion(self, text: str) -> str:
+    def analyze_text_emotion(self, text: str) -> str:
         """
         Analyze text to determine appropriate emotional tone
         """
         # Simple emotion detection based on keywords and punctuation
-        text_lower = text.lower()
-
         # Excitement indicators
-        if '!' in text or any(word in text_lower for word in ['amazing', 'incredible', 'fantastic', 'wonderful']):
+        if '!' in text:
             return 'excited'
 
-        # Sadness indicators
-        if any(word in text_lower for word in ['sad', 'tragic', 'sorrow', 'grief', 'died', 'death']):
-            return 'sad'
-
-        # Fear indicators
-        if any(word in text_lower for word in ['scared', 'terrified', 'afraid', 'horror', 'nightmare']):
-            return 'fearful'
+        # One scan for every keyword; the highest-priority emotion found wins
+        detected = None
+        for match in _EMOTION_RE.finditer(text):
+            emotion = _WORD_TO_EMOTION[match.group(1).lower()]
+            if detected is None or _EMOTION_PRIORITY[emotion] < _EMOTION_PRIORITY[detected]:
+                detected = emotion
+                if _EMOTION_PRIORITY[emotion] == 0:
+                    break
 
-        # Anger indicators
-        if any(word in text_lower for word in ['angry', 'furious', 'rage', 'hate', 'damn']):
-            return 'angry'
-
-        # Cheerful indicators
-        if any(word in text_lower for word in ['happy', 'joy', 'laugh', 'smile', 'cheerful']):
-            return 'cheerful'
-
-        return 'neutral'
+        return detected or 'neutral'
 
     async def create_audiobook_chapter(
         self,
@@ -216,22 +396,61 @@ class AdvancedTTSEngine:
         """
         Create a complete audiobook chapter with intro and enhanced narration
         """
+        return b''.join([
+            audio_chunk
+            async for audio_chunk in self.stream_audiobook_chapter(
+                chapter_text,
+                voice_profile,
+                chapter_number,
+                book_title
+            )
+        ])
+
+    async def stream_audiobook_chapter(
+        self,
+        chapter_text: str,
+        voice_profile: str,
+        chapter_number: int,
+        book_title: str
+    ) -> AsyncIterator[bytes]:
+        """
+        Create an audiobook chapter, yielding each piece of audio in order as soon as it is ready
+        """
         # Add chapter introduction
         intro_text = f"Chapter {chapter_number}."
 
         # Analyze chapter for emotional tone
-        dominant_emotion = await self.analyze_text_emotion(chapter_text)
+        dominant_emotion = self.analyze_text_emotion(chapter_text)
 
-        # Create full chapter SSML
-        full_ssml = self.create_chapter_ssml(
+        # Create chapter SSML, split so the pieces can be synthesized in parallel
+        ssml_parts = self.create_chapter_ssml(
             intro_text,
             chapter_text,
             voice_profile,
             dominant_emotion
         )
-
-        # Synthesize complete chapter
-        return await self.synthesize_ssml(full_ssml)
+        voice = _VOICE_PROFILES.get(voice_profile, _VOICE_PROFILES['jenny_professional'])
+        semaphore = asyncio.Semaphore(self.CHAPTER_CONCURRENCY)
+
+        async def synthesize_part(ssml: str) -> bytes:
+            # Unchanged sentences hit the cache when a chapter is regenerated
+            part_key = SynthesisCache.make_key(ssml)
+            part_audio = self.chapter_piece_cache.get(part_key)
+            if part_audio is None:
+                async with semaphore:
+                    part_audio = await self.synthesize_ssml(ssml, voice.name, self.AUDIOBOOK_FORMAT)
+                self.chapter_piece_cache.put(part_key, part_audio)
+            return part_audio
+
+        # Awaited in submission order; constant-bitrate MP3 pieces concatenate cleanly
+        tasks = [asyncio.create_task(synthesize_part(ssml)) for ssml in ssml_parts]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            # Stop synthesizing if the consumer gave up or a piece failed
+            for task in tasks:
+                task.cancel()
 
     def create_chapter_ssml(
         self,
@@ -239,49 +458,76 @@ class AdvancedTTSEngine:
         chapter_text: str,
         voice_profile: str,
         emotion: str
-    ) -> str:
+    ) -> List[str]:
         """
-        Create SSML for a complete chapter with proper pacing
-        """
-        voice = self.voice_profiles.get(voice_profile, self.voice_profiles['jenny_professional'])
-
-        ssml = f"""
-        <speak version="1.0" xmlns="<http://www.w3.org/2001/10/synthesis>"
-               xmlns:mstts="<https://www.w3.org/2001/mstts>" xml:lang="en-US">
-            <voice name="{voice.name}">
-                <!-- Chapter Introduction -->
-                <mstts:express-as style="newscast">
-                    <prosody rate="0.9" pitch="medium">
-                        {intro_text}
-                        <break time="2s"/>
-                    </prosody>
-                </mstts:express-as>
-
-                <!-- Chapter Content -->
-                <mstts:express-as style="{emotion if emotion != 'neutral' else 'friendly'}">
-                    <prosody rate="1.0" pitch="medium">
-                        {self.enhance_text_for_speech(chapter_text)}
-                    </prosody>
-                </mstts:express-as>
-
-                <!-- Chapter End -->
-                <break time="3s"/>
-            </voice>
-        </speak>
+        Create SSML for a complete chapter with proper pacing, as one document
+        for the introduction followed by one per chunk of sentences
         """
+        voice = _VOICE_PROFILES.get(voice_profile, _VOICE_PROFILES['jenny_professional'])
 
-        return ssml
+        # Chapter Introduction
+        ssml_parts = [''.join((
+            _ssml_header(voice.name, 'style="newscast"', 0.9, 'medium'),
+            intro_text,
+            '<break time="2s"/>',
+            _SSML_FOOTER
+        ))]
+
+        # Chapter Content
+        content_header = _ssml_header(
+            voice.name,
+            f'style="{emotion if emotion != "neutral" else "friendly"}"',
+            1.0,
+            'medium'
+        )
+        chunks = _chunk_sentences(chapter_text)
+        for index, chunk in enumerate(chunks):
+            # Chapter End pause follows the last chunk
+            footer = _SSML_CHAPTER_END_FOOTER if index == len(chunks) - 1 else _SSML_FOOTER
+            ssml_parts.append(''.join((content_header, self.enhance_text_for_speech(chunk), footer)))
+
+        return ssml_parts
 
 # FastAPI endpoints for advanced TTS
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uuid
+import aiofiles
 
-app = FastAPI()
-tts_engine = AdvancedTTSEngine(
-    speech_key=os.getenv('AZURE_SPEECH_KEY'),
-    speech_region=os.getenv('AZURE_SPEECH_REGION')
-)
+# Audiobook jobs wait here for one of the TTS_WORKERS long-running workers
+_JOB_QUEUE: asyncio.Queue = asyncio.Queue()
+N_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    workers = [asyncio.create_task(_worker_loop()) for _ in range(N_WORKERS)]
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # Only close the engine if a request actually created it
+        if get_engine.cache_info().currsize:
+            await get_engine().close()
+
+app = FastAPI(lifespan=lifespan)
+
+@lru_cache(maxsize=None)
+def get_engine() -> AdvancedTTSEngine:
+    """
+    Shared engine, created on first use so importing this module stays cheap
+    and each server worker builds its own Azure connections
+    """
+    if not _SPEECH_KEY or not _SPEECH_REGION:
+        raise RuntimeError("Azure TTS env vars not set: AZURE_SPEECH_KEY and AZURE_SPEECH_REGION are required")
+
+    return AdvancedTTSEngine(
+        speech_key=_SPEECH_KEY,
+        speech_region=_SPEECH_REGION
+    )
 
 class TTSRequest(BaseModel):
     text: str
@@ -289,6 +535,8 @@ class TTSRequest(BaseModel):
     emotion: str = 'neutral'
     speaking_rate: float = 1.0
     pitch: str = 'medium'
+    # Smaller 16 kHz MP3 suits previews; Ogg48Khz16BitMonoOpus suits streaming clients
+    output_format: str = 'Audio16Khz32KBitRateMonoMp3'
 
 class AudiobookRequest(BaseModel):
     chapter_text: str
@@ -298,44 +546,54 @@ class AudiobookRequest(BaseModel):
 
 @app.post("/synthesize-advanced")
 async def synthesize_advanced_speech(request: TTSRequest):
+    if request.output_format not in _OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {request.output_format}")
+
     try:
-        audio_data = await tts_engine.synthesize_with_emotions(
+        audio_stream = get_engine().stream_with_emotions(
             request.text,
             request.voice_profile,
             request.emotion,
             request.speaking_rate,
-            request.pitch
+            request.pitch,
+            request.output_format
         )
 
-        return {
-            "audio_data": audio_data.hex(),
-            "content_type": "audio/mpeg",
-            "voice_profile": request.voice_profile,
-            "emotion": request.emotion
-        }
+        # Wait for the first chunk here so a failed synthesis is still reported as a 500
+        first_chunk = await anext(audio_stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def audio_chunks():
+        yield first_chunk
+        async for chunk in audio_stream:
+            yield chunk
+
+    return StreamingResponse(
+        audio_chunks(),
+        media_type=_MEDIA_TYPES[request.output_format],
+        headers={"X-Voice-Profile": request.voice_profile, "X-Emotion": request.emotion}
+    )
+
 @app.post("/create-audiobook-chapter")
-async def create_audiobook_chapter(request: AudiobookRequest, background_tasks: BackgroundTasks):
+async def create_audiobook_chapter(request: AudiobookRequest):
     try:
         # Generate unique job ID
         job_id = str(uuid.uuid4())
 
-        # Start background processing
-        background_tasks.add_task(
-            process_audiobook_chapter,
-            job_id,
-            request.chapter_text,
-            request.voice_profile,
-            request.chapter_number,
-            request.book_title
-        )
+        # Queue for the background workers
+        await _JOB_QUEUE.put({
+            "job_id": job_id,
+            "chapter_text": request.chapter_text,
+            "voice_profile": request.voice_profile,
+            "chapter_number": request.chapter_number,
+            "book_title": request.book_title
+        })
 
         return {
             "job_id": job_id,
-            "status": "processing",
-            "message": "Audiobook chapter generation started"
+            "status": "queued",
+            "message": "Audiobook chapter generation queued"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -347,18 +605,20 @@ async def process_audiobook_chapter(
     chapter_number: int,
     book_title: str
 ):
+    file_path = f"audiobooks/{job_id}_chapter_{chapter_number}.mp3"
+    part_path = file_path + '.part'
     try:
-        audio_data = await tts_engine.create_audiobook_chapter(
-            chapter_text,
-            voice_profile,
-            chapter_number,
-            book_title
-        )
-
-        # Save audio file
-        file_path = f"audiobooks/{job_id}_chapter_{chapter_number}.mp3"
-        with open(file_path, 'wb') as f:
-            f.write(audio_data)
+        # Save audio file piece by piece while the rest of the chapter is synthesized,
+        # then move it into place so a truncated chapter never appears at file_path
+        async with aiofiles.open(part_path, 'wb') as f:
+            async for audio_chunk in get_engine().stream_audiobook_chapter(
+                chapter_text,
+                voice_profile,
+                chapter_number,
+                book_title
+            ):
+                await f.write(audio_chunk)
+        os.replace(part_path, file_path)
 
         # Update job status in database
         # await update_job_status(job_id, 'completed', file_path)
@@ -366,3 +626,15 @@ async def process_audiobook_chapter(
     except Exception as e:
         # await update_job_status(job_id, 'failed', str(e))
         print(f"Audiobook generation failed: {e}")
+    finally:
+        # Also covers a job cancelled mid-write
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+async def _worker_loop():
+    while True:
+        job = await _JOB_QUEUE.get()
+        try:
+            await process_audiobook_chapter(**job)
+        finally:
+            _JOB_QUEUE.task_done()
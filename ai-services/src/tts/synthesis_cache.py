@@ -0,0 +1,28 @@
+# ai-services/src/tts/synthesis_cache.py
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+class SynthesisCache:
+    """
+    LRU cache of synthesized audio keyed on everything that affects the output
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio_data = self._entries.get(key)
+        if audio_data is not None:
+            self._entries.move_to_end(key)
+        return audio_data
+
+    def put(self, key: str, audio_data: bytes):
+        self._entries[key] = audio_data
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
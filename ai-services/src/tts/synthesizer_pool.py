@@ -0,0 +1,137 @@
+# ai-services/src/tts/synthesizer_pool.py
+import azure.cognitiveservices.speech as speechsdk
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+class SynthesizerPool:
+    """
+    Connected Azure synthesizers per (voice, output format), reused so requests skip the
+    connection handshake. A synthesizer runs one synthesis at a time, so each key gets up
+    to max_concurrency of them, created on demand
+    """
+    # Seconds between checks that pooled synthesizer connections are still open
+    KEEPALIVE_INTERVAL = 25
+
+    def __init__(
+        self,
+        speech_key: str,
+        speech_region: str,
+        max_concurrency: int,
+        set_output_format: Callable[[speechsdk.SpeechConfig, str], None]
+    ):
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.max_concurrency = max_concurrency
+        self._set_output_format = set_output_format
+
+        # Upper bound on Azure synthesis calls in flight, so bursts queue here instead of being throttled
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._idle_synthesizers: Dict[Tuple[str, str], asyncio.Queue] = {}
+        self._synthesizer_counts: Dict[Tuple[str, str], int] = {}
+        self._connections: Dict[Tuple[str, str], List[speechsdk.Connection]] = {}
+        # The SDK call each checked-out synthesizer is blocked in, if any
+        self._pending: Dict[speechsdk.SpeechSynthesizer, asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def checkout(self, voice_name: str, output_format: str) -> AsyncIterator[speechsdk.SpeechSynthesizer]:
+        """
+        Hold an Azure slot and borrow a synthesizer bound to one voice and output format
+        for a single synthesis
+        """
+        key = (voice_name, output_format)
+        async with self._slots:
+            # Holding a slot means one is always idle or can still be created
+            async with self._lock:
+                idle = self._idle_synthesizers.setdefault(key, asyncio.Queue())
+                if idle.empty() and self._synthesizer_counts.get(key, 0) < self.max_concurrency:
+                    idle.put_nowait(self._create_synth(voice_name, output_format))
+                    self._synthesizer_counts[key] = self._synthesizer_counts.get(key, 0) + 1
+
+            synthesizer = await idle.get()
+            try:
+                yield synthesizer
+            finally:
+                pending = self._pending.pop(synthesizer, None)
+                if pending is None or pending.done():
+                    idle.put_nowait(synthesizer)
+                else:
+                    # The caller was cancelled mid-call. Stop Azure and wait for the thread,
+                    # so neither the slot nor the synthesizer is freed while still in use
+                    synthesizer.stop_speaking_async()
+                    try:
+                        await asyncio.wait({pending})
+                    except asyncio.CancelledError:
+                        # Cancelled again while stopping; hand the synthesizer back once it is idle
+                        pending.add_done_callback(lambda _: idle.put_nowait(synthesizer))
+                        raise
+                    idle.put_nowait(synthesizer)
+
+    async def run(self, synthesizer: speechsdk.SpeechSynthesizer, call: Callable[[], Any]) -> Any:
+        """
+        Run a blocking SDK call on a checked-out synthesizer off the event loop
+        """
+        # Shielded so cancelling the caller doesn't lose track of the thread still running the call
+        pending = asyncio.ensure_future(asyncio.to_thread(call))
+        self._pending[synthesizer] = pending
+        result = await asyncio.shield(pending)
+        del self._pending[synthesizer]
+        return result
+
+    def _create_synth(self, voice_name: str, output_format: str) -> speechsdk.SpeechSynthesizer:
+        # Each synthesizer gets its own config with the voice bound up front,
+        # so concurrent requests for different voices never share mutable state
+        speech_config = speechsdk.SpeechConfig(
+            subscription=self.speech_key,
+            region=self.speech_region
+        )
+        speech_config.speech_synthesis_voice_name = voice_name
+        self._set_output_format(speech_config, output_format)
+
+        # No audio config: audio is returned in memory
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=speech_config,
+            audio_config=None
+        )
+
+        # Connect now rather than on the first synthesis
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+
+        self._connections.setdefault((voice_name, output_format), []).append(connection)
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keep_connections_open())
+
+        return synthesizer
+
+    async def _keep_connections_open(self):
+        """
+        Reopen pooled connections that Azure closed while idle, so the next
+        request for that voice doesn't pay for the handshake
+        """
+        while True:
+            await asyncio.sleep(self.KEEPALIVE_INTERVAL)
+            for key, connections in list(self._connections.items()):
+                for connection in list(connections):
+                    try:
+                        await asyncio.to_thread(connection.open, True)
+                    except Exception as e:
+                        # Keep the loop alive for the other voices; this one reconnects on its next use
+                        print(f"Keepalive failed for {key}: {e}")
+
+    async def close(self):
+        """
+        Stop the keepalive loop and close pooled connections
+        """
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+
+        for connections in self._connections.values():
+            for connection in connections:
+                connection.close()
+        self._connections.clear()
+        self._idle_synthesizers.clear()
+        self._synthesizer_counts.clear()
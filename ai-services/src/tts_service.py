@@ -3,13 +3,57 @@ from azure.cognitiveservices.speech import SpeechConfig, SpeechSynthesizer, Audi
 from azure.cognitiveservices.speech.audio import AudioOutputConfig
 import os
 import asyncio
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import Optional
+from tts.synthesis_cache import SynthesisCache
+from tts.synthesizer_pool import SynthesizerPool
+
+# Upper bound on Azure synthesis calls in flight, so bursts queue here instead of being throttled
+_AZURE_CONCURRENCY = int(os.getenv("AZURE_TTS_CONCURRENCY", "3"))
+
+# Everything enhance_text_for_speech rewrites, matched in a single pass
+_SPEECH_RE = re.compile(r'(?P<quote>"[^"]*")|(?P<pause>[.,;:])')
+
+# Pauses after punctuation
+_PAUSES = {
+    '.': '.<break time="500ms"/>',
+    ',': ',<break time="200ms"/>',
+    ';': ';<break time="300ms"/>',
+    ':': ':<break time="250ms"/>'
+}
+
+def _speech_replacement(match: re.Match) -> str:
+    matched = match.group()
+    if match.lastgroup == 'pause':
+        return _PAUSES[matched]
+
+    # Add emphasis to quoted text
+    return f'<emphasis level="moderate">"{_SPEECH_RE.sub(_speech_replacement, matched[1:-1])}"</emphasis>'
+
+@lru_cache(maxsize=1024)
+def _enhance_text_for_speech(text: str) -> str:
+    """
+    Add pauses and emphasis for natural speech (pure, so results are cached)
+    """
+    return _SPEECH_RE.sub(_speech_replacement, text)
+
+def _set_output_format(speech_config: SpeechConfig, output_format: str):
+    speech_config.set_speech_synthesis_output_format_by_name(output_format)
 
 class TextToSpeechService:
     def __init__(self):
-        self.speech_config = SpeechConfig(
-            subscription=os.getenv('AZURE_SPEECH_KEY'),
-            region=os.getenv('AZURE_SPEECH_REGION')
+        self.speech_key = os.getenv('AZURE_SPEECH_KEY')
+        self.speech_region = os.getenv('AZURE_SPEECH_REGION')
+        self.synthesis_cache = SynthesisCache(max_entries=256)
+
+        # Connected synthesizers per (voice, output format), shared by every request
+        self._synth_pool = SynthesizerPool(
+            self.speech_key,
+            self.speech_region,
+            _AZURE_CONCURRENCY,
+            _set_output_format
         )
 
     async def synthesize_text(
@@ -22,27 +66,30 @@ class TextToSpeechService:
         """
         Convert text to speech using Azure Cognitive Services
         """
-        self.speech_config.speech_synthesis_voice_name = voice_name
-        self.speech_config.set_speech_synthesis_output_format_by_name(output_format)
+        cache_key = SynthesisCache.make_key(text, voice_name, speaking_rate, output_format)
+        cached_audio = self.synthesis_cache.get(cache_key)
+        if cached_audio is not None:
+            return cached_audio
 
         # Create SSML for better control
         ssml = self.create_ssml(text, voice_name, speaking_rate)
 
-        # Configure audio output to memory
-        audio_config = AudioOutputConfig(use_default_speaker=False)
-        synthesizer = SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config
-        )
-
-        # Synthesize speech
-        result = synthesizer.speak_ssml_async(ssml).get()
+        # Synthesize speech off the event loop
+        async with self._synth_pool.checkout(voice_name, output_format) as synthesizer:
+            result = await self._synth_pool.run(synthesizer, lambda: synthesizer.speak_ssml_async(ssml).get())
 
         if result.reason == result.reason.SynthesizingAudioCompleted:
+            self.synthesis_cache.put(cache_key, result.audio_data)
             return result.audio_data
         else:
             raise Exception(f"Speech synthesis failed: {result.reason}")
 
+    async def close(self):
+        """
+        Stop the keepalive loop and close pooled connections
+        """
+        await self._synth_pool.close()
+
     def create_ssml(self, text: str, voice_name: str, speaking_rate: float) -> str:
         """
         Create SSML markup for enhanced speech synthesis
@@ -65,26 +112,21 @@ class TextToSpeechService:
         """
         Add pauses and emphasis for natural speech
         """
-        import re
-
-        # Add pauses at punctuation
-        text = re.sub(r'\\.', '.<break time="500ms"/>', text)
-        text = re.sub(r',', ',<break time="200ms"/>', text)
-        text = re.sub(r';', ';<break time="300ms"/>', text)
-        text = re.sub(r':', ':<break time="250ms"/>', text)
-
-        # Add emphasis to quoted text
-        text = re.sub(r'"([^"]*)"', r'<emphasis level="moderate">"\\1"</emphasis>', text)
-
-        return text
+        return _enhance_text_for_speech(text)
 
 # FastAPI endpoint
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 
-app = FastAPI()
 tts_service = TextToSpeechService()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await tts_service.close()
+
+app = FastAPI(lifespan=lifespan)
+
 class TTSRequest(BaseModel):
     text: str
     voice_name: str = "en-US-JennyNeural"
@@ -99,9 +141,6 @@ async def synthesize_speech(request: TTSRequest):
             request.speaking_rate
         )
 
-        return {
-            "audio_data": audio_data.hex(),  # Convert to hex for JSON transport
-            "content_type": "audio/mpeg"
-        }
+        return Response(content=audio_data, media_type="audio/mpeg")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))